@@ -4,7 +4,7 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-from models import db, Product, AdminSettings
+from models import db, Product, AdminSettings, add_missing_columns
 
 
 def create_app():
@@ -16,6 +16,51 @@ def create_app():
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max upload
 
+    # Laser bed used for gang-sheet engraving jobs
+    app.config['LASER_BED_WIDTH_MM'] = float(os.getenv('LASER_BED_WIDTH_MM', '600'))
+    app.config['LASER_BED_HEIGHT_MM'] = float(os.getenv('LASER_BED_HEIGHT_MM', '400'))
+    app.config['LASER_DPI'] = int(os.getenv('LASER_DPI', '300'))
+
+    # Shipped orders older than this move to the monthly archive (flask archive-orders)
+    app.config['ARCHIVE_AFTER_DAYS'] = float(os.getenv('ARCHIVE_AFTER_DAYS', '180'))
+
+    # Bulk business orders: rendering processes per web worker, optional TTF for engraved names
+    app.config['BULK_RENDER_WORKERS'] = int(os.getenv('BULK_RENDER_WORKERS', '0')) or None
+    app.config['BULK_FONT_PATH'] = os.getenv('BULK_FONT_PATH')
+
+    # Let Nginx send files after Flask's access checks: 'x-accel', 'x-sendfile', or unset to send from Python
+    app.config['FILE_SENDER'] = os.getenv('FILE_SENDER', '').lower()
+    app.config['FILE_ACCEL_PREFIX'] = os.getenv('FILE_ACCEL_PREFIX', '/_protected')
+
+    # Admission control for upload, cart and checkout endpoints
+    app.config['RATELIMIT_ENABLED'] = os.getenv('RATELIMIT_ENABLED', 'true').lower() == 'true'
+    app.config['IMAGE_PROCESSING_SLOTS'] = int(os.getenv('IMAGE_PROCESSING_SLOTS', '0')) or os.cpu_count()
+
+    # On-demand request profiling (admin Profiles page); seconds between stack samples
+    app.config['PROFILING_ENABLED'] = os.getenv('PROFILING_ENABLED', 'true').lower() == 'true'
+    app.config['PROFILE_INTERVAL'] = float(os.getenv('PROFILE_INTERVAL', '0.005'))
+    app.config['PROFILE_KEEP'] = int(os.getenv('PROFILE_KEEP', '50'))
+
+    # Slow-query log (flask query-report); the sample rate keeps EXPLAIN overhead low in production
+    app.config['QUERYLOG_ENABLED'] = os.getenv('QUERYLOG_ENABLED', 'false').lower() == 'true'
+    app.config['QUERYLOG_THRESHOLD_MS'] = float(os.getenv('QUERYLOG_THRESHOLD_MS', '50'))
+    app.config['QUERYLOG_SAMPLE_RATE'] = float(os.getenv('QUERYLOG_SAMPLE_RATE', '0.1'))
+
+    # Build minified, precompressed static bundles at startup (static/dist/)
+    app.config['ASSET_BUNDLE'] = os.getenv('ASSET_BUNDLE', 'true').lower() == 'true'
+
+    # Admin new-order emails go out as digests: every window, every N orders, or at once for big orders
+    app.config['ADMIN_DIGEST_WINDOW'] = int(os.getenv('ADMIN_DIGEST_WINDOW', '300'))
+    app.config['ADMIN_DIGEST_MAX_ORDERS'] = int(os.getenv('ADMIN_DIGEST_MAX_ORDERS', '50'))
+    app.config['ADMIN_DIGEST_URGENT_TOTAL'] = float(os.getenv('ADMIN_DIGEST_URGENT_TOTAL', '500'))
+
+    # Trust X-Forwarded-For from this many proxies (1 behind Nginx) so limits apply per client IP
+    proxy_count = int(os.getenv('PROXY_COUNT') or 0)
+    app.config['PROXY_COUNT'] = proxy_count
+    if proxy_count:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_count, x_proto=proxy_count)
+
     # Initialize extensions
     db.init_app(app)
 
@@ -30,9 +75,29 @@ def create_app():
     app.register_blueprint(cart_bp)
     app.register_blueprint(admin_bp)
 
+    # Static asset bundles
+    from utils.assets import init_assets
+    init_assets(app)
+
+    # Server-side cart previews
+    from utils.preview import init_previews
+    init_previews(app)
+
+    # Request profiling hooks
+    from utils.profiling import init_profiling
+    init_profiling(app)
+
+    # CLI commands
+    from cli import register_commands
+    register_commands(app)
+
     # Create tables and seed initial data
     with app.app_context():
+        from utils.querylog import init_query_log
+        init_query_log(app, db.engine)
         db.create_all()
+        with db.engine.begin() as connection:
+            add_missing_columns(connection, db.metadata.sorted_tables)
         seed_initial_data()
 
     return app
@@ -0,0 +1,326 @@
+"""
+Flask CLI commands for Let Me Mug You (run with `flask <command>`).
+"""
+import os
+import sys
+import time
+import tempfile
+import click
+from utils.export import stream_orders, EXPORT_FORMATS
+from utils.uploads import collect_upload_garbage, DEFAULT_GRACE_DAYS
+from utils.archive import archive_orders, ARCHIVE_BATCH_SIZE
+
+
+def format_bytes(size):
+    """Human-readable byte count."""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f'{size:.1f} {unit}' if unit != 'B' else f'{size} B'
+        size /= 1024
+
+
+def register_commands(app):
+    """Attach the CLI commands to the app."""
+
+    @app.cli.command('export-orders')
+    @click.option('--format', 'fmt', type=click.Choice(EXPORT_FORMATS), default='csv', show_default=True)
+    @click.option('--items', is_flag=True, help='Export one row per order item instead of per order.')
+    @click.option('--status', default='', help='Order status filter.')
+    @click.option('--payment-status', default='', help='Payment status filter.')
+    @click.option('--start', default='', help='First order date (YYYY-MM-DD).')
+    @click.option('--end', default='', help='Last order date, inclusive (YYYY-MM-DD).')
+    @click.option('--live-only', is_flag=True, help='Skip archived orders.')
+    @click.option('--output', '-o', type=click.Path(dir_okay=False), help='Output file (default: stdout).')
+    def export_orders(fmt, items, status, payment_status, start, end, live_only, output):
+        """Stream orders as CSV or JSONL for accounting."""
+        out = open(output, 'wb') if output else sys.stdout.buffer
+        try:
+            for chunk in stream_orders(fmt, 'items' if items else 'orders', not live_only, status=status,
+                                       payment_status=payment_status, start=start, end=end):
+                out.write(chunk)
+        finally:
+            if output:
+                out.close()
+            else:
+                out.flush()
+
+    @app.cli.command('gc-uploads')
+    @click.option('--grace-days', type=float, default=DEFAULT_GRACE_DAYS, show_default=True,
+                  help='Only remove unreferenced files older than this.')
+    @click.option('--dry-run', is_flag=True, help='Report what would be removed without deleting.')
+    @click.option('--interval', type=int, default=0,
+                  help='Keep running, collecting every N seconds (scheduled mode).')
+    def gc_uploads(grace_days, dry_run, interval):
+        """Remove uploaded logos and previews that no order references, and unused SVG cache entries."""
+        while True:
+            started = time.perf_counter()
+            results = collect_upload_garbage(grace_days, dry_run)
+            for name, stats in results.items():
+                click.echo(f"{name}: {stats['files']} files, {format_bytes(stats['bytes'])} on disk, "
+                           f"{'would remove' if dry_run else 'removed'} {stats['removed']} "
+                           f"({format_bytes(stats['reclaimed_bytes'])} reclaimed)"
+                           + (f", {stats['sharded']} moved into shards" if stats.get('sharded') else ''))
+            click.echo(f'Done in {time.perf_counter() - started:.2f}s')
+            if not interval:
+                break
+            time.sleep(interval)
+
+    @app.cli.command('archive-orders')
+    @click.option('--days', type=float, default=None,
+                  help='Archive orders shipped more than this many days ago (default: ARCHIVE_AFTER_DAYS).')
+    @click.option('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE, show_default=True)
+    @click.option('--dry-run', is_flag=True, help='Report what would be archived without moving anything.')
+    @click.option('--interval', type=int, default=0,
+                  help='Keep running, archiving every N seconds (scheduled mode).')
+    def archive_orders_command(days, batch_size, dry_run, interval):
+        """Move long-shipped orders out of the live tables into monthly archive files."""
+        if days is None:
+            days = app.config['ARCHIVE_AFTER_DAYS']
+        while True:
+            started = time.perf_counter()
+            stats = archive_orders(days, batch_size, dry_run)
+            months = ', '.join(sorted(stats['months'])) or 'none'
+            click.echo(f"{'Would archive' if dry_run else 'Archived'} {stats['orders']} orders "
+                       f"({stats['items']} items) into months: {months}")
+            click.echo(f'Done in {time.perf_counter() - started:.2f}s')
+            if not interval:
+                break
+            time.sleep(interval)
+
+    @app.cli.command('bench-logo')
+    @click.option('--megapixels', type=float, default=4, show_default=True, help='Synthetic image size.')
+    @click.option('--repeat', type=int, default=3, show_default=True, help='Runs per processor (best is reported).')
+    def bench_logo(megapixels, repeat):
+        """Benchmark the logo processors on a synthetic photographic image."""
+        from routes.api import (process_logo_to_bw, process_logo_dither, process_logo_transparent,
+                                remove_white_background, remove_background_connected)
+        from utils.dither import DITHER_METHODS
+
+        side = int((megapixels * 1_000_000) ** 0.5)
+
+        processors = [('bw', process_logo_to_bw)]
+        processors += [(f'dither:{method}', lambda src, dst, m=method: process_logo_dither(src, dst, m))
+                       for method in DITHER_METHODS]
+        processors += [('transparent', process_logo_transparent), ('remove_bg', remove_white_background),
+                       ('remove_bg_connected', remove_background_connected)]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            # Generate the source in a child too, so its memory isn't left resident here
+            source = os.path.join(tmp, 'source.png')
+            _run_in_child(_write_synthetic_photo, source, side)
+            click.echo(f'{side}x{side} ({side * side / 1e6:.1f} MP), best of {repeat}')
+            click.echo(f"  {'processor':<24} {'time':>11} {'peak RSS':>12}")
+            for name, processor in processors:
+                best, peak = _run_isolated(processor, source, os.path.join(tmp, 'out.png'), repeat)
+                peak_text = format_bytes(peak) if peak is not None else 'n/a'
+                click.echo(f'  {name:<24} {best * 1000:8.1f} ms {peak_text:>12}')
+
+    @app.cli.command('bench-limiter')
+    @click.option('--iterations', type=int, default=5000, show_default=True, help='Checks per measurement.')
+    def bench_limiter(iterations):
+        """Measure the per-request overhead of rate limiting and the processing-slot cap."""
+        from utils.ratelimit import take_token, processing_slot
+
+        def measure(label, check):
+            started = time.perf_counter()
+            for i in range(iterations):
+                check(i)
+            elapsed = time.perf_counter() - started
+            click.echo(f'  {label:<28} {elapsed / iterations * 1e6:8.1f} us/check')
+
+        def hold_slot(i):
+            with processing_slot('bench'):
+                pass
+
+        run = os.getpid()
+        click.echo(f'{iterations} iterations')
+        measure('token bucket (same key)', lambda i: take_token(f'bench:{run}', 1e9, 1e9))
+        measure('token bucket (new keys)', lambda i: take_token(f'bench:{run}:{i}', 10, 1))
+        measure('processing slot', hold_slot)
+
+    @app.cli.command('bench-checkout')
+    @click.option('--url', default='http://127.0.0.1:8000', show_default=True, help='Running app to load.')
+    @click.option('--concurrency', type=int, default=20, show_default=True, help='Simultaneous create-order calls.')
+    @click.option('--stub-port', type=int, default=8765, show_default=True, help='Port for the stub PayPal API.')
+    @click.option('--stub-delay', type=float, default=1.0, show_default=True, help='Seconds the stub takes to answer.')
+    def bench_checkout(url, concurrency, stub_port, stub_delay):
+        """
+        Load-test PayPal checkout against a slow stub PayPal API.
+
+        Start the app with PAYPAL_API_BASE=http://127.0.0.1:<stub-port> and
+        RATELIMIT_ENABLED=false, then compare sync and gevent workers.
+        """
+        import requests
+        from concurrent.futures import ThreadPoolExecutor
+
+        stub = _start_paypal_stub(stub_port, stub_delay)
+        try:
+            client = requests.Session()
+            response = client.post(f'{url}/cart/add', json={'product_id': 1, 'quantity': 1})
+            if not response.ok:
+                raise click.ClickException(f'Could not fill the cart: HTTP {response.status_code}')
+            cookies = client.cookies.get_dict()
+            client.post(f'{url}/api/paypal/create-order', cookies=cookies)  # Warm the token cache
+
+            def create_order(_):
+                return requests.post(f'{url}/api/paypal/create-order', cookies=cookies).status_code
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                statuses = list(executor.map(create_order, range(concurrency)))
+            elapsed = time.perf_counter() - started
+        finally:
+            stub.shutdown()
+
+        click.echo(f'{concurrency} concurrent create-order calls in {elapsed:.2f} s '
+                   f'(stub answers in {stub_delay:g} s), statuses {sorted(set(statuses))}')
+
+    @app.cli.command('send-admin-digest')
+    @click.option('--due-only', is_flag=True, help='Only send if the oldest buffered order has waited a full window.')
+    def send_admin_digest(due_only):
+        """Send buffered new-order notifications as one admin digest (safe to run from cron)."""
+        from utils.notifications import flush_admin_digest, pending_summary
+
+        pending, _ = pending_summary()
+        sent = flush_admin_digest(force=not due_only)
+        click.echo(f'{sent} of {pending} buffered order(s) sent')
+
+    @app.cli.command('query-report')
+    @click.option('--limit', type=int, default=20, show_default=True, help='Fingerprints to show.')
+    @click.option('--sort', type=click.Choice(['total', 'max', 'count']), default='total', show_default=True)
+    @click.option('--flagged', is_flag=True, help='Only statements whose plan scans a table or sorts in a temp b-tree.')
+    @click.option('--reset', is_flag=True, help='Clear the slow-query log after printing.')
+    def query_report(limit, sort, flagged, reset):
+        """Rank the slowest statement fingerprints from the slow-query log (QUERYLOG_ENABLED)."""
+        from utils.querylog import slow_query_report, reset_slow_queries
+
+        path = os.path.join(app.instance_path, 'querylog.db')
+        rows = slow_query_report(path, limit=limit if not flagged else -1, order_by=sort)
+        if flagged:
+            rows = [row for row in rows if row['flags']][:limit]
+        if not rows:
+            click.echo('No slow queries recorded.')
+        sample_rate = app.config['QUERYLOG_SAMPLE_RATE']
+        click.echo(f"Threshold {app.config['QUERYLOG_THRESHOLD_MS']:g} ms, sample rate {sample_rate:g} "
+                   f"(counts are sampled executions)\n")
+        for rank, row in enumerate(rows, 1):
+            click.echo(f"{rank:>2}. {row['count']} x  total {row['total_ms']:.1f} ms  "
+                       f"avg {row['total_ms'] / row['count']:.1f} ms  max {row['max_ms']:.1f} ms")
+            if row['flags']:
+                click.echo(f"    !! {row['flags']}")
+            click.echo(f"    {row['statement'][:300]}")
+            click.echo(f"    params {row['params']}")
+            for line in (row['plan'] or '').splitlines():
+                click.echo(f'      {line}')
+            click.echo()
+        if reset:
+            reset_slow_queries(path)
+            click.echo('Slow-query log cleared.')
+
+
+def _write_synthetic_photo(path, side):
+    """Noisy two-way gradient - the kind of image that defeats a fixed threshold."""
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    gradient = np.linspace(0, 255, side, dtype=np.float32)
+    pixels = gradient[None, :] * 0.6 + gradient[:, None] * 0.4 + rng.normal(0, 20, (side, side))
+    gray = np.clip(pixels, 0, 255).astype(np.uint8)
+    Image.fromarray(np.repeat(gray[:, :, None], 3, axis=2), 'RGB').save(path)
+
+
+def _read_status_kb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) * 1024
+    return None
+
+
+def _bench_child(conn, processor, source, output, repeat):
+    baseline = None
+    try:
+        # Reset the peak-RSS high-water mark inherited from the parent (Linux only)
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        baseline = _read_status_kb('VmRSS')
+    except OSError:
+        pass
+
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        processor(source, output)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    peak = None
+    if baseline is not None:
+        peak = max(0, _read_status_kb('VmHWM') - baseline)
+    conn.send((best, peak))
+    conn.close()
+
+
+def _run_isolated(processor, source, output, repeat):
+    """
+    Time a processor in a forked child so its peak RSS growth can be measured on its own.
+
+    Returns (best_seconds, peak_rss_bytes); peak is None where fork or /proc aren't available.
+    """
+    import multiprocessing
+    try:
+        context = multiprocessing.get_context('fork')
+    except ValueError:
+        started = time.perf_counter()
+        processor(source, output)
+        return time.perf_counter() - started, None
+
+    parent_conn, child_conn = context.Pipe(duplex=False)
+    child = context.Process(target=_bench_child, args=(child_conn, processor, source, output, repeat))
+    child.start()
+    result = parent_conn.recv()
+    child.join()
+    return result
+
+
+def _run_in_child(func, *args):
+    """Run func(*args) in a forked child so the memory it allocates is freed with the child."""
+    import multiprocessing
+    try:
+        context = multiprocessing.get_context('fork')
+    except ValueError:
+        return func(*args)
+
+    child = context.Process(target=func, args=args)
+    child.start()
+    child.join()
+    if child.exitcode:
+        raise click.ClickException(f'{func.__name__} failed in a child process (exit code {child.exitcode})')
+
+
+def _start_paypal_stub(port, delay):
+    """Serve a PayPal API stand-in that answers every call after delay seconds, in a background thread."""
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    body = json.dumps({'access_token': 'stub', 'expires_in': 3600, 'id': 'STUBORDER', 'status': 'COMPLETED'}).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,19 @@
+"""
+Gunicorn hooks for Let Me Mug You (worker options live in start_gunicorn.sh).
+"""
+import os
+
+
+def post_worker_init(worker):
+    """Warm each worker up after it forks and loads the app, before it accepts connections."""
+    from utils.warmup import warm_up
+    warm_up(worker.wsgi)
+
+
+def when_ready(server):
+    """Warn when limits would key on the proxy's address instead of each client's."""
+    proxied = any(isinstance(address, str) for address in server.cfg.address)  # unix socket binds
+    limits_on = os.getenv('RATELIMIT_ENABLED', 'true').lower() == 'true'
+    if proxied and limits_on and not int(os.getenv('PROXY_COUNT') or 0):
+        server.log.warning('Bound to a unix socket with rate limiting on but PROXY_COUNT unset: '
+                           'every client would share one per-IP bucket. Set PROXY_COUNT=1 behind Nginx.')
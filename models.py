@@ -18,6 +18,9 @@ class Product(db.Model):
     active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    price_tiers = db.relationship('PriceTier', backref='product', lazy=True, cascade='all, delete-orphan',
+                                  order_by='PriceTier.min_quantity')
+
     def get_sizes(self):
         if self.sizes:
             return json.loads(self.sizes)
@@ -26,6 +29,18 @@ class Product(db.Model):
     def set_sizes(self, sizes_list):
         self.sizes = json.dumps(sizes_list)
 
+    def get_price_tiers(self):
+        return [{'min_quantity': t.min_quantity, 'unit_price': t.unit_price_cents / 100} for t in self.price_tiers]
+
+
+class PriceTier(db.Model):
+    __tablename__ = 'price_tiers'
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False, index=True)
+    min_quantity = db.Column(db.Integer, nullable=False)  # Tier applies from this many pieces
+    unit_price_cents = db.Column(db.Integer, nullable=False)
+
 
 class Order(db.Model):
     __tablename__ = 'orders'
@@ -49,6 +64,7 @@ class Order(db.Model):
     # Order details
     order_date = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(20), default='pending')  # pending, processing, completed, shipped
+    shipped_at = db.Column(db.DateTime)  # Set when the order moves to shipped (utils/orders.py)
     subtotal = db.Column(db.Float, default=0)
     tax = db.Column(db.Float, default=0)
     total = db.Column(db.Float, default=0)
@@ -93,6 +109,51 @@ class OrderItem(db.Model):
         self.logo_position_data = json.dumps(data)
 
 
+class ArchivedOrder(db.Model):
+    """Index row for an order moved to a monthly archive file (see utils/archive.py)."""
+    __tablename__ = 'archived_orders'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # Original order id
+    order_number = db.Column(db.String(20), unique=True, nullable=False)
+    order_date = db.Column(db.DateTime, index=True)
+    customer_name = db.Column(db.String(100))
+    email = db.Column(db.String(120))
+    business_name = db.Column(db.String(100))
+    status = db.Column(db.String(20))
+    payment_status = db.Column(db.String(20))
+    total = db.Column(db.Float, default=0)
+    item_count = db.Column(db.Integer, default=0)
+    archive_month = db.Column(db.String(7), nullable=False, index=True)  # YYYY-MM
+
+
+class ArchiveMonth(db.Model):
+    """Per-month archive totals, so dashboards never scan archived orders."""
+    __tablename__ = 'archive_months'
+
+    month = db.Column(db.String(7), primary_key=True)  # YYYY-MM
+    orders = db.Column(db.Integer, default=0)
+    items = db.Column(db.Integer, default=0)
+    paid_revenue = db.Column(db.Float, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class AdminNotification(db.Model):
+    """A new-order event waiting to go out in an admin digest email (see utils/notifications.py)."""
+    __tablename__ = 'admin_notifications'
+
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, nullable=False)
+    order_number = db.Column(db.String(20))
+    customer_name = db.Column(db.String(100))
+    email = db.Column(db.String(120))
+    business_name = db.Column(db.String(100))
+    total = db.Column(db.Float, default=0)
+    item_count = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    batch = db.Column(db.String(32), index=True)  # Set when a digest claims the row
+    sent_at = db.Column(db.DateTime, index=True)
+
+
 class AdminSettings(db.Model):
     __tablename__ = 'admin_settings'
 
@@ -114,3 +175,19 @@ class AdminSettings(db.Model):
             setting = AdminSettings(key=key, value=value)
             db.session.add(setting)
         db.session.commit()
+
+
+def add_missing_columns(connection, tables):
+    """
+    ALTER TABLE ADD COLUMN for model columns an existing SQLite table lacks.
+
+    create_all only creates missing tables, so this keeps databases (and
+    archive files) made before a column was added usable. New columns must
+    be nullable.
+    """
+    for table in tables:
+        existing = {row[1] for row in connection.exec_driver_sql(f'PRAGMA table_info({table.name})')}
+        for column in table.columns:
+            if existing and column.name not in existing:
+                column_type = column.type.compile(dialect=connection.dialect)
+                connection.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}')
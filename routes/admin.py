@@ -1,7 +1,19 @@
 import os
 from functools import wraps
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify, current_app, abort, Response, stream_with_context
+from werkzeug.utils import secure_filename
 from models import Product, Order, OrderItem, AdminSettings, db
+from utils.gangsheet import build_gang_sheets, list_jobs, get_jobs_folder
+from utils.export import stream_artwork_zip, stream_orders, EXPORT_FORMATS
+from utils.bulk import parse_bulk_csv, start_bulk_order, load_job, list_bulk_jobs, DEFAULT_FONT_SIZE
+from utils.archive import load_archived_order, search_archived_orders, archived_totals
+from utils.files import send_protected
+from utils.orders import transition_orders, summarize_results, ORDER_STATUSES
+from utils.profiling import (list_profiles, make_profile_token, get_sampling_mode, set_sampling_mode,
+                             clear_sampling_mode, get_profile_folder, TOKEN_MAX_AGE)
+from utils.uploads import get_logo_path
+from utils.pricing import quote, totals_for, parse_tiers, format_tiers, set_product_tiers, invalidate_prices
+from routes.cart import generate_order_number
 from datetime import datetime, timedelta
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
@@ -40,11 +52,12 @@ def logout():
 @admin_required
 def dashboard():
     """Admin dashboard with stats."""
-    # Get stats
-    total_orders = Order.query.count()
-    total_revenue = db.session.query(db.func.sum(Order.total)).filter(
+    # Get stats (archived orders come from the per-month totals)
+    archived_orders, archived_revenue = archived_totals()
+    total_orders = Order.query.count() + archived_orders
+    total_revenue = (db.session.query(db.func.sum(Order.total)).filter(
         Order.payment_status == 'paid'
-    ).scalar() or 0
+    ).scalar() or 0) + archived_revenue
 
     # This month
     month_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
@@ -73,17 +86,10 @@ def dashboard():
     )
 
 
-@admin_bp.route('/orders')
-@admin_required
-def orders():
-    """Order list with filtering."""
-    status = request.args.get('status', '')
-    search = request.args.get('search', '')
-
-    query = Order.query
-
+def filter_orders(query, status, search):
+    """Apply the order list's status and search filters to a query."""
     if status:
-        query = query.filter_by(status=status)
+        query = query.filter(Order.status == status)
 
     if search:
         query = query.filter(
@@ -93,32 +99,270 @@ def orders():
                 Order.email.ilike(f'%{search}%')
             )
         )
+    return query
+
 
-    orders = query.order_by(Order.order_date.desc()).all()
-    return render_template('admin/orders.html', orders=orders, status=status, search=search)
+@admin_bp.route('/orders')
+@admin_required
+def orders():
+    """Order list with filtering."""
+    status = request.args.get('status', '')
+    search = request.args.get('search', '')
+
+    orders = filter_orders(Order.query, status, search).order_by(Order.order_date.desc()).all()
+    archived_orders = search_archived_orders(search) if search else []
+    return render_template('admin/orders.html', orders=orders, archived_orders=archived_orders,
+                           status=status, search=search, statuses=ORDER_STATUSES)
+
+
+@admin_bp.route('/orders/export')
+@admin_required
+def export_orders():
+    """Stream orders (or ?type=items) as CSV or JSONL."""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        fmt = 'csv'
+    kind = 'items' if request.args.get('type') == 'items' else 'orders'
+    filters = {
+        'status': request.args.get('status', ''),
+        'payment_status': request.args.get('payment_status', ''),
+        'start': request.args.get('start', ''),
+        'end': request.args.get('end', ''),
+    }
+    archived = not request.args.get('live_only')
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    filename = f"{kind}-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+    return Response(stream_with_context(stream_orders(fmt, kind, archived, **filters)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
+@admin_bp.route('/orders/export/artwork')
+@admin_required
+def export_artwork():
+    """Stream a ZIP of engraving-ready artwork for orders in a status/date range."""
+    filters = {
+        'status': request.args.get('status', ''),
+        'start': request.args.get('start', ''),
+        'end': request.args.get('end', ''),
+        'archived': not request.args.get('live_only'),
+    }
+    chunks = (chunk for chunk in stream_artwork_zip(**filters) if chunk)
+    filename = f"artwork-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.zip"
+    return Response(stream_with_context(chunks), mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
+BULK_CUSTOMER_FIELDS = ('customer_name', 'email', 'phone', 'business_name', 'address_line1',
+                        'address_line2', 'city', 'state', 'zip_code', 'notes')
+
+
+@admin_bp.route('/orders/bulk', methods=['GET', 'POST'])
+@admin_required
+def bulk_order():
+    """Create a personalized order for a business customer from a CSV."""
+    products = Product.query.filter_by(active=True).order_by(Product.name).all()
+
+    if request.method == 'POST':
+        product = Product.query.get(request.form.get('product_id', type=int))
+        upload = request.files.get('csv')
+        customer = {field: request.form.get(field, '').strip() for field in BULK_CUSTOMER_FIELDS}
+        if not product or not upload or not upload.filename:
+            flash('Choose a product and a CSV file', 'error')
+            return redirect(url_for('admin.bulk_order'))
+        if not customer['customer_name'] or not customer['email']:
+            flash('Customer name and email are required', 'error')
+            return redirect(url_for('admin.bulk_order'))
+
+        size = request.form.get('size', '').strip()
+        shared_logo = request.form.get('logo_filename', '').strip()
+        rows, errors = parse_bulk_csv(upload.stream, product, size, shared_logo)
+        if errors:
+            for error in errors:
+                flash(error, 'error')
+            return redirect(url_for('admin.bulk_order'))
+
+        layout = {
+            'font_size': request.form.get('font_size', type=int) or DEFAULT_FONT_SIZE,
+            'logo_position': {
+                'left': request.form.get('left'),
+                'top': request.form.get('top'),
+                'scaleX': request.form.get('scale'),
+                'scaleY': request.form.get('scale'),
+                'angle': request.form.get('angle'),
+            },
+        }
+        prices, subtotal_cents = quote([(product.id, row['quantity']) for row in rows])
+        for row, (unit_cents, line_cents) in zip(rows, prices):
+            row['unit_cents'], row['line_cents'] = unit_cents, line_cents
+        totals = totals_for(subtotal_cents)
+        job = start_bulk_order(generate_order_number(), customer, product, layout, rows, totals)
+        flash(f"Bulk order {job['order_number']} queued: {len(rows)} items", 'success')
+        return redirect(url_for('admin.bulk_order'))
+
+    jobs = list_bulk_jobs()
+    return render_template('admin/bulk_order.html',
+        products=products,
+        jobs=jobs,
+        running=any(job['status'] in ('queued', 'rendering') for job in jobs),
+        customer_fields=BULK_CUSTOMER_FIELDS,
+        font_size=DEFAULT_FONT_SIZE
+    )
+
+
+@admin_bp.route('/orders/bulk/<job_id>')
+@admin_required
+def bulk_order_status(job_id):
+    """Bulk order job status as JSON."""
+    job = load_job(secure_filename(job_id))
+    if not job:
+        abort(404)
+    return jsonify(job)
 
 
 @admin_bp.route('/orders/<int:order_id>')
 @admin_required
 def order_detail(order_id):
     """Order detail view."""
-    order = Order.query.get_or_404(order_id)
-    return render_template('admin/order_detail.html', order=order)
+    order = db.session.get(Order, order_id)
+    archived = False
+    if order is None:
+        order = load_archived_order(order_id)
+        archived = True
+    if order is None:
+        abort(404)
+    return render_template('admin/order_detail.html', order=order, archived=archived)
+
+
+@admin_bp.route('/orders/<int:order_id>/items/<int:item_id>/artwork')
+@admin_required
+def order_item_artwork(order_id, item_id):
+    """
+    Download the engraving artwork for an order item, named after the order.
+
+    The logo itself is also public at its (unguessable) /static upload URL;
+    the admin check only keeps order ids from being mapped to upload names.
+    """
+    order = db.session.get(Order, order_id) or load_archived_order(order_id)
+    item = next((item for item in order.items if item.id == item_id), None) if order else None
+    if item is None or not item.logo_filename:
+        abort(404)
+    return send_protected('uploads', get_logo_path(item.logo_filename), as_attachment=True,
+                          download_name=f'{order.order_number}_{item.id}_{item.logo_filename}')
 
 
 @admin_bp.route('/orders/<int:order_id>/status', methods=['POST'])
 @admin_required
 def update_order_status(order_id):
     """Update order status."""
-    order = Order.query.get_or_404(order_id)
+    Order.query.get_or_404(order_id)
     new_status = request.form.get('status')
-    if new_status in ['pending', 'processing', 'completed', 'shipped']:
-        order.status = new_status
-        db.session.commit()
-        flash(f'Order status updated to {new_status}', 'success')
+    if new_status in ORDER_STATUSES:
+        # A single order can be set to any status by hand, as before; bulk moves follow the rules
+        result = transition_orders([order_id], new_status, enforce_transitions=False)[0]
+        if result['result'] == 'updated':
+            flash(f'Order status updated to {new_status}', 'success')
+        else:
+            flash(result['message'], 'error')
     return redirect(url_for('admin.order_detail', order_id=order_id))
 
 
+@admin_bp.route('/orders/status', methods=['POST'])
+@admin_required
+def update_order_statuses():
+    """
+    Move many orders to a new status in one transaction.
+
+    Takes selected order_ids, or scope=filter to use the list's status/search
+    filter. Returns per-order results as JSON or a results page.
+    """
+    data = request.get_json(silent=True) or request.form
+    new_status = data.get('new_status')
+    if new_status not in ORDER_STATUSES:
+        if request.is_json:
+            return jsonify({'error': 'Invalid status'}), 400
+        flash('Choose a status', 'error')
+        return redirect(url_for('admin.orders', status=data.get('status', ''), search=data.get('search', '')))
+
+    if data.get('scope') == 'filter':
+        order_ids = [order_id for (order_id,) in
+                     filter_orders(Order.query.with_entities(Order.id), data.get('status', ''), data.get('search', ''))]
+    elif request.is_json:
+        order_ids = data.get('order_ids') or []
+    else:
+        order_ids = request.form.getlist('order_ids')
+    try:
+        order_ids = [int(order_id) for order_id in order_ids]
+    except (TypeError, ValueError):
+        if request.is_json:
+            return jsonify({'error': 'Invalid order ids'}), 400
+        flash('Invalid order selection', 'error')
+        return redirect(url_for('admin.orders', status=data.get('status', ''), search=data.get('search', '')))
+    if not order_ids:
+        if request.is_json:
+            return jsonify({'error': 'No orders selected'}), 400
+        flash('No orders selected', 'error')
+        return redirect(url_for('admin.orders', status=data.get('status', ''), search=data.get('search', '')))
+
+    results = transition_orders(order_ids, new_status)
+    counts = summarize_results(results)
+    if request.is_json:
+        return jsonify({'status': new_status, 'counts': counts, 'results': results})
+    return render_template('admin/status_results.html', new_status=new_status, counts=counts,
+                           results=results, status=data.get('status', ''), search=data.get('search', ''))
+
+
+@admin_bp.route('/production', methods=['GET', 'POST'])
+@admin_required
+def production():
+    """Batch processing order items into laser gang-sheet jobs."""
+    if request.method == 'POST':
+        category = request.form.get('category', '')
+        try:
+            bed_width = float(request.form.get('bed_width') or current_app.config['LASER_BED_WIDTH_MM'])
+            bed_height = float(request.form.get('bed_height') or current_app.config['LASER_BED_HEIGHT_MM'])
+            gap = float(request.form.get('gap') or 3)
+        except ValueError:
+            flash('Invalid bed size', 'error')
+            return redirect(url_for('admin.production'))
+
+        manifest = build_gang_sheets(category, bed_width, bed_height,
+                                     dpi=current_app.config['LASER_DPI'], gap_mm=gap)
+        if manifest['placements']:
+            flash(f"Job {manifest['job_id']}: {len(manifest['placements'])} pieces on "
+                  f"{len(manifest['sheets'])} sheet(s)", 'success')
+        else:
+            flash(f'No engravable {category} items in processing orders', 'error')
+        if manifest['skipped']:
+            flash(f"{len(manifest['skipped'])} piece(s) skipped - see manifest", 'error')
+        return redirect(url_for('admin.production'))
+
+    # Pending pieces per category
+    pending = dict(db.session.query(Product.category, db.func.sum(OrderItem.quantity))
+                   .join(OrderItem, OrderItem.product_id == Product.id)
+                   .join(Order, OrderItem.order_id == Order.id)
+                   .filter(Order.status == 'processing')
+                   .group_by(Product.category)
+                   .all())
+
+    return render_template('admin/production.html',
+        pending=pending,
+        jobs=list_jobs(),
+        bed_width=current_app.config['LASER_BED_WIDTH_MM'],
+        bed_height=current_app.config['LASER_BED_HEIGHT_MM']
+    )
+
+
+@admin_bp.route('/production/jobs/<job_id>/<filename>')
+@admin_required
+def production_job_file(job_id, filename):
+    """Download a job sheet or manifest."""
+    job_id = secure_filename(job_id)
+    filename = secure_filename(filename)
+    if not job_id or not filename:
+        abort(404)
+    return send_protected('jobs', os.path.join(get_jobs_folder(), job_id, filename), as_attachment=True)
+
+
 @admin_bp.route('/products')
 @admin_required
 def products():
@@ -132,6 +376,11 @@ def products():
 def add_product():
     """Add new product."""
     if request.method == 'POST':
+        try:
+            tiers = parse_tiers(request.form.get('price_tiers', ''))
+        except ValueError as e:
+            flash(str(e), 'error')
+            return render_template('admin/product_form.html', product=None, price_tiers='')
         product = Product(
             name=request.form.get('name'),
             category=request.form.get('category'),
@@ -143,11 +392,13 @@ def add_product():
         sizes = request.form.get('sizes', '')
         if sizes:
             product.set_sizes([s.strip() for s in sizes.split(',') if s.strip()])
+        set_product_tiers(product, tiers)
         db.session.add(product)
         db.session.commit()
+        invalidate_prices()
         flash('Product added successfully', 'success')
         return redirect(url_for('admin.products'))
-    return render_template('admin/product_form.html', product=None)
+    return render_template('admin/product_form.html', product=None, price_tiers='')
 
 
 @admin_bp.route('/products/<int:product_id>/edit', methods=['GET', 'POST'])
@@ -156,6 +407,11 @@ def edit_product(product_id):
     """Edit product."""
     product = Product.query.get_or_404(product_id)
     if request.method == 'POST':
+        try:
+            tiers = parse_tiers(request.form.get('price_tiers', ''))
+        except ValueError as e:
+            flash(str(e), 'error')
+            return redirect(url_for('admin.edit_product', product_id=product_id))
         product.name = request.form.get('name')
         product.category = request.form.get('category')
         product.base_price = float(request.form.get('base_price', 0))
@@ -167,10 +423,12 @@ def edit_product(product_id):
             product.set_sizes([s.strip() for s in sizes.split(',') if s.strip()])
         else:
             product.sizes = None
+        set_product_tiers(product, tiers)
         db.session.commit()
+        invalidate_prices()
         flash('Product updated successfully', 'success')
         return redirect(url_for('admin.products'))
-    return render_template('admin/product_form.html', product=product)
+    return render_template('admin/product_form.html', product=product, price_tiers=format_tiers(product))
 
 
 @admin_bp.route('/products/<int:product_id>/delete', methods=['POST'])
@@ -180,6 +438,7 @@ def delete_product(product_id):
     product = Product.query.get_or_404(product_id)
     db.session.delete(product)
     db.session.commit()
+    invalidate_prices()
     flash('Product deleted', 'success')
     return redirect(url_for('admin.products'))
 
@@ -194,6 +453,49 @@ def toggle_product(product_id):
     return jsonify({'success': True, 'active': product.active})
 
 
+@admin_bp.route('/profiles', methods=['GET', 'POST'])
+@admin_required
+def profiles():
+    """Request profiles: issue profiling tokens, run sampling mode, download results."""
+    if request.method == 'POST':
+        if request.form.get('action') == 'stop':
+            clear_sampling_mode()
+            flash('Sampling stopped', 'success')
+        else:
+            try:
+                every = int(request.form.get('every') or 100)
+                minutes = float(request.form.get('minutes') or 10)
+            except ValueError:
+                flash('Invalid sampling settings', 'error')
+                return redirect(url_for('admin.profiles'))
+            if every < 1 or not 0 < minutes <= 24 * 60:
+                flash('Invalid sampling settings', 'error')
+                return redirect(url_for('admin.profiles'))
+            set_sampling_mode(every, minutes, request.form.get('endpoint', '').strip())
+            flash(f'Profiling every {every} request(s) for {minutes:g} minutes', 'success')
+        return redirect(url_for('admin.profiles'))
+
+    mode = get_sampling_mode()
+    return render_template('admin/profiles.html',
+        profiles=list_profiles(),
+        token=make_profile_token(),
+        token_minutes=TOKEN_MAX_AGE // 60,
+        mode=mode,
+        mode_until=datetime.fromtimestamp(mode['until']) if mode else None,
+        endpoints=sorted(rule.endpoint for rule in current_app.url_map.iter_rules())
+    )
+
+
+@admin_bp.route('/profiles/<filename>')
+@admin_required
+def profile_file(filename):
+    """Download a profile's collapsed stacks or pstats file."""
+    filename = secure_filename(filename)
+    if not filename.endswith(('.collapsed', '.pstats')):
+        abort(404)
+    return send_protected('profiles', os.path.join(get_profile_folder(), filename), as_attachment=True)
+
+
 @admin_bp.route('/settings', methods=['GET', 'POST'])
 @admin_required
 def settings():
@@ -1,23 +1,39 @@
 import os
+import re
+import sys
 import uuid
-from flask import Blueprint, request, jsonify, current_app
+import shutil
+import contextvars
+from flask import Blueprint, request, jsonify, abort
 from werkzeug.utils import secure_filename
 from PIL import Image, ImageOps, ImageFilter
 import numpy as np
 from models import Product, db
+from utils.preview import get_preview_path, THUMBNAIL_SIZES
+from utils.uploads import get_logo_path, get_logo_url
+from utils.dither import dither, DITHER_METHODS
+from utils.tiles import load_rgba_buffer, iter_strips, buffer_image, near_white_mask, STRIP_ROWS
+from utils.floodfill import border_connected_runs
+from utils.svg import process_svg
+from utils.ratelimit import rate_limit, limit_concurrency
+from utils.files import send_protected
+from utils.pricing import quote, totals_for, to_dollars
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'svg'}
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
+DEFAULT_TOLERANCE = 30  # How far from pure white still counts as background
+MAX_FEATHER = 10  # Pixels
+MAX_QUOTE_ITEMS = 10000
 
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def process_logo_to_bw(image_path, output_path):
-    """Convert uploaded image to high-contrast black & white for laser engraving."""
+def prepare_grayscale(image_path):
+    """Open an uploaded image flattened onto white, as auto-contrasted grayscale."""
     img = Image.open(image_path)
 
     # Handle transparency - convert to white background
@@ -35,7 +51,12 @@ def process_logo_to_bw(image_path, output_path):
     img = img.convert('L')
 
     # Auto contrast for better results
-    img = ImageOps.autocontrast(img)
+    return ImageOps.autocontrast(img)
+
+
+def process_logo_to_bw(image_path, output_path):
+    """Convert uploaded image to high-contrast black & white for laser engraving."""
+    img = prepare_grayscale(image_path)
 
     # Apply threshold for pure B&W
     threshold = 128
@@ -48,6 +69,17 @@ def process_logo_to_bw(image_path, output_path):
     return img.size  # Return dimensions
 
 
+def process_logo_dither(image_path, output_path, method='floyd_steinberg'):
+    """Dither a photographic logo to black & white, keeping gradients engravable."""
+    img = dither(prepare_grayscale(image_path), method)
+
+    # Convert back to RGB for consistency with bw mode
+    img = img.convert('RGB')
+
+    img.save(output_path, 'PNG')
+    return img.size
+
+
 def process_logo_transparent(image_path, output_path):
     """Keep the original logo with transparency preserved."""
     img = Image.open(image_path)
@@ -60,36 +92,110 @@ def process_logo_transparent(image_path, output_path):
     return img.size
 
 
-def remove_white_background(image_path, output_path, tolerance=30):
-    """Remove white/near-white background and make it transparent."""
+def remove_white_background(image_path, output_path, tolerance=DEFAULT_TOLERANCE):
+    """
+    Remove white/near-white background and make it transparent.
+
+    Works in strips on one shared RGBA buffer, so the only full-size
+    allocation besides the decoded upload is the output itself.
+    """
     img = Image.open(image_path)
+    img.load()
+    size = img.size
+    buffer, data = load_rgba_buffer(img)
+    del img  # The decoded upload isn't needed once the buffer is filled
 
-    # Convert to RGBA
-    if img.mode != 'RGBA':
-        img = img.convert('RGBA')
+    # A pixel is considered white if R, G, B are all above (255 - tolerance)
+    white_threshold = 255 - tolerance
+    mask = np.empty((STRIP_ROWS, size[0]), dtype=bool)
+    for _, strip in iter_strips(data):
+        white_mask = near_white_mask(strip, white_threshold, out=mask[:strip.shape[0]])
+        # Make white pixels transparent (in place)
+        strip[:, :, 3][white_mask] = 0
 
-    # Get image data as numpy array
-    data = np.array(img)
+    result = buffer_image(buffer, size)
+    result.save(output_path, 'PNG')
+    return result.size
 
-    # Calculate how "white" each pixel is
-    # A pixel is considered white if R, G, B are all above (255 - tolerance)
-    r, g, b, a = data[:, :, 0], data[:, :, 1], data[:, :, 2], data[:, :, 3]
 
-    # Find pixels that are white or near-white
-    white_threshold = 255 - tolerance
-    white_mask = (r >= white_threshold) & (g >= white_threshold) & (b >= white_threshold)
+def remove_background_connected(image_path, output_path, tolerance=DEFAULT_TOLERANCE, feather=0):
+    """
+    Remove only the near-white background connected to the image border.
 
-    # Make white pixels transparent
-    data[:, :, 3] = np.where(white_mask, 0, a)
+    White areas enclosed by the logo (letter counters, highlights) are kept.
+    feather softens the cut edge by that many pixels.
+    """
+    img = Image.open(image_path)
+    img.load()
+    size = img.size
+    buffer, data = load_rgba_buffer(img)
+    del img
 
-    # Create new image from modified data
-    result = Image.fromarray(data, 'RGBA')
+    white_threshold = 255 - tolerance
+    mask = np.empty((size[1], size[0]), dtype=bool)
+    for top, strip in iter_strips(data):
+        near_white_mask(strip, white_threshold, out=mask[top:top + strip.shape[0]])
+
+    rows, starts, ends = border_connected_runs(mask)
+    del mask
+
+    if feather:
+        cleared = np.zeros((size[1], size[0]), dtype=np.uint8)
+        for row, start, end in zip(rows.tolist(), starts.tolist(), ends.tolist()):
+            cleared[row, start:end] = 255
+        # Blur the cleared region into the logo edge and fade alpha with it
+        soft = np.asarray(Image.fromarray(cleared, 'L').filter(ImageFilter.GaussianBlur(feather)))
+        del cleared
+        for top, strip in iter_strips(data):
+            alpha = strip[:, :, 3]
+            np.minimum(alpha, 255 - soft[top:top + strip.shape[0]], out=alpha)
+    else:
+        for row, start, end in zip(rows.tolist(), starts.tolist(), ends.tolist()):
+            data[row, start:end, 3] = 0
 
+    result = buffer_image(buffer, size)
     result.save(output_path, 'PNG')
     return result.size
 
 
+def process_upload(ext, mode, original_path, processed_path, dither_method, tolerance, feather):
+    """Process an uploaded logo in place for the selected mode (SVGs are sanitized instead)."""
+    if ext == 'svg':
+        dimensions = process_svg(original_path, processed_path)
+        # The raw upload may carry scripts, so never leave it in static
+        shutil.copyfile(processed_path, original_path)
+        return dimensions
+    if mode == 'dither':
+        return process_logo_dither(original_path, processed_path, dither_method)
+    if mode == 'transparent':
+        return process_logo_transparent(original_path, processed_path)
+    if mode == 'remove_bg':
+        return remove_white_background(original_path, processed_path, tolerance)
+    if mode == 'remove_bg_connected':
+        return remove_background_connected(original_path, processed_path, tolerance, feather)
+    return process_logo_to_bw(original_path, processed_path)
+
+
+def run_off_event_loop(func, *args):
+    """
+    Run CPU-bound work without stalling a gevent worker's other requests.
+
+    Under gevent, greenlets share one OS thread, so the work goes to gevent's
+    pool of real threads (Pillow and numpy release the GIL while they work).
+    Sync workers just call func.
+    """
+    # Copy the context so the app context is still there in the other thread
+    call = contextvars.copy_context().run
+    if 'gevent' in sys.modules:
+        from gevent import monkey, get_hub
+        if monkey.is_module_patched('threading'):
+            return get_hub().threadpool.apply(call, (func,) + args)
+    return call(func, *args)
+
+
 @api_bp.route('/upload-logo', methods=['POST'])
+@rate_limit('upload')
+@limit_concurrency('image')
 def upload_logo():
     """Handle logo upload, validate, and process based on selected mode."""
     if 'logo' not in request.files:
@@ -102,11 +208,22 @@ def upload_logo():
     if not allowed_file(file.filename):
         return jsonify({'error': 'File type not allowed. Use PNG, JPG, or SVG.'}), 400
 
-    # Get processing mode: 'bw', 'transparent', or 'remove_bg'
+    # Get processing mode: 'bw', 'dither', 'transparent', 'remove_bg', or 'remove_bg_connected'
     mode = request.form.get('mode', 'bw')
-    if mode not in ('bw', 'transparent', 'remove_bg'):
+    if mode not in ('bw', 'dither', 'transparent', 'remove_bg', 'remove_bg_connected'):
         mode = 'bw'
 
+    # Dither variant: 'floyd_steinberg', 'atkinson', or 'bayer'
+    dither_method = request.form.get('dither', 'floyd_steinberg')
+    if dither_method not in DITHER_METHODS:
+        dither_method = 'floyd_steinberg'
+
+    # Background tolerance for remove_bg modes (0-255) and edge feathering in pixels
+    tolerance = request.form.get('tolerance', DEFAULT_TOLERANCE, type=int)
+    tolerance = max(0, min(255, tolerance))
+    feather = request.form.get('feather', 0, type=int)
+    feather = max(0, min(MAX_FEATHER, feather))
+
     # Check file size
     file.seek(0, 2)
     size = file.tell()
@@ -114,46 +231,34 @@ def upload_logo():
     if size > MAX_FILE_SIZE:
         return jsonify({'error': 'File too large. Maximum 5MB.'}), 400
 
-    # Generate unique filename
+    # Generate unique filename - original and processed share the upload id
+    # so the upload GC can tell they belong together
     ext = file.filename.rsplit('.', 1)[1].lower()
-    unique_name = f"{uuid.uuid4().hex}.{ext}"
+    upload_id = uuid.uuid4().hex
+    unique_name = f"{upload_id}.{ext}"
 
     # Name processed file based on mode
-    mode_suffix = {'bw': '_bw', 'transparent': '_trans', 'remove_bg': '_nobg'}
-    processed_name = f"{uuid.uuid4().hex}{mode_suffix[mode]}.png"
+    mode_suffix = {'bw': '_bw', 'dither': '_dither', 'transparent': '_trans', 'remove_bg': '_nobg',
+                   'remove_bg_connected': '_nobgc'}
+    processed_ext = 'svg' if ext == 'svg' else 'png'
+    processed_name = f"{upload_id}{mode_suffix[mode]}.{processed_ext}"
 
-    upload_folder = os.path.join(current_app.root_path, 'static', 'uploads', 'logos')
-    os.makedirs(upload_folder, exist_ok=True)
-
-    original_path = os.path.join(upload_folder, unique_name)
-    processed_path = os.path.join(upload_folder, processed_name)
+    original_path = get_logo_path(unique_name, for_write=True)
+    processed_path = get_logo_path(processed_name, for_write=True)
 
     file.save(original_path)
 
-    # Process based on mode (skip processing for SVG)
-    if ext != 'svg':
-        try:
-            if mode == 'bw':
-                dimensions = process_logo_to_bw(original_path, processed_path)
-            elif mode == 'transparent':
-                dimensions = process_logo_transparent(original_path, processed_path)
-            elif mode == 'remove_bg':
-                dimensions = remove_white_background(original_path, processed_path)
-            else:
-                dimensions = process_logo_to_bw(original_path, processed_path)
-        except Exception as e:
-            os.remove(original_path)
-            return jsonify({'error': f'Image processing failed: {str(e)}'}), 400
-    else:
-        # For SVG, just copy
-        import shutil
-        shutil.copy(original_path, processed_path)
-        dimensions = (200, 200)  # Placeholder for SVG
+    try:
+        dimensions = run_off_event_loop(process_upload, ext, mode, original_path, processed_path,
+                                        dither_method, tolerance, feather)
+    except Exception as e:
+        os.remove(original_path)
+        return jsonify({'error': f'Image processing failed: {str(e)}'}), 400
 
     return jsonify({
         'success': True,
-        'original_url': f'/static/uploads/logos/{unique_name}',
-        'processed_url': f'/static/uploads/logos/{processed_name}',
+        'original_url': get_logo_url(unique_name),
+        'processed_url': get_logo_url(processed_name),
         'filename': processed_name,
         'width': dimensions[0],
         'height': dimensions[1],
@@ -161,6 +266,24 @@ def upload_logo():
     })
 
 
+@api_bp.route('/preview/<key>.png', methods=['GET'])
+def preview_image(key):
+    """Serve a server-rendered preview, optionally as a thumbnail (?size=80)."""
+    if not re.fullmatch(r'[0-9a-f]{40}', key):
+        abort(404)
+
+    size = request.args.get('size', type=int)
+    if size is not None and size not in THUMBNAIL_SIZES:
+        return jsonify({'error': f'Invalid size. Use one of {list(THUMBNAIL_SIZES)}.'}), 400
+
+    path = get_preview_path(key, size)
+    if path is None:
+        abort(404)
+
+    # Content is addressed by hash, so it never changes
+    return send_protected('uploads', path, mimetype='image/png', max_age=31536000)
+
+
 @api_bp.route('/products', methods=['GET'])
 def get_products():
     """Get all active products."""
@@ -172,7 +295,8 @@ def get_products():
         'base_price': p.base_price,
         'description': p.description,
         'image_url': p.image_url,
-        'sizes': p.get_sizes()
+        'sizes': p.get_sizes(),
+        'price_tiers': p.get_price_tiers()
     } for p in products])
 
 
@@ -187,5 +311,41 @@ def get_product(product_id):
         'base_price': product.base_price,
         'description': product.description,
         'image_url': product.image_url,
-        'sizes': product.get_sizes()
+        'sizes': product.get_sizes(),
+        'price_tiers': product.get_price_tiers()
+    })
+
+
+@api_bp.route('/quote', methods=['POST'])
+@rate_limit('quote')
+def quote_items():
+    """
+    Price many line items in one call.
+
+    Body: {"items": [{"product_id": 1, "quantity": 12}, ...], "aggregate": true}
+    With aggregate (the default), quantity tiers use each product's total
+    across all items, the way the cart prices them.
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'items must be a non-empty list'}), 400
+    if len(items) > MAX_QUOTE_ITEMS:
+        return jsonify({'error': f'At most {MAX_QUOTE_ITEMS} items per quote'}), 400
+
+    try:
+        lines = [(int(item['product_id']), int(item.get('quantity', 1))) for item in items]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Each item needs a product_id and an integer quantity'}), 400
+    if any(quantity < 1 for _, quantity in lines):
+        return jsonify({'error': 'Quantities must be at least 1'}), 400
+
+    try:
+        prices, subtotal_cents = quote(lines, aggregate=data.get('aggregate', True) is not False)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 404
+
+    return jsonify({
+        'items': [{'unit_price': to_dollars(unit), 'line_total': to_dollars(line)} for unit, line in prices],
+        'totals': totals_for(subtotal_cents)
     })
@@ -3,9 +3,19 @@ import uuid
 import requests
 from flask import Blueprint, render_template, request, jsonify, session, redirect, url_for, current_app
 from models import Product, Order, OrderItem, AdminSettings, db
+from utils.uploads import get_logo_path
+from utils.preview import render_preview
+from utils import paypal
+from utils.email import send_order_emails_async
+from utils.notifications import queue_admin_notification
+from utils.ratelimit import rate_limit
+from utils.pricing import get_price_table, reprice_product, summarize_cart, totals_for
 
 cart_bp = Blueprint('cart', __name__)
 
+MAX_QUANTITY = 1000
+MAX_BATCH_OPS = 100
+
 
 def get_cart():
     """Get cart from session."""
@@ -20,13 +30,40 @@ def save_cart(cart):
     session.modified = True
 
 
+def get_cart_summary(cart):
+    """
+    Running cart subtotal (in cents) and per-product quantities.
+
+    Rebuilt with a full pass only when missing or when prices have changed
+    since it was made; cart edits update it incrementally.
+    """
+    table = get_price_table()
+    summary = session.get('cart_summary')
+    if not summary or summary.get('version') != table.version or summary.get('lines') != len(cart):
+        summary = summarize_cart(cart, table)
+        session['cart_summary'] = summary
+        session.modified = True
+    return summary
+
+
+def reprice_cart(cart, product_id):
+    """Reprice the lines for one product after an edit. Returns the ids of lines whose price changed."""
+    table = get_price_table()
+    summary = session.get('cart_summary')
+    if not summary or summary.get('version') != table.version:
+        summary = summarize_cart(cart, table)
+        changed = [item['id'] for item in cart]
+    else:
+        changed = reprice_product(cart, summary, product_id, table)
+        summary['lines'] = len(cart)
+    session['cart_summary'] = summary
+    session.modified = True
+    return changed
+
+
 def calculate_totals(cart):
     """Calculate cart totals."""
-    subtotal = sum(item['line_total'] for item in cart)
-    tax_rate = float(AdminSettings.get('tax_rate', '0.0825'))  # Default 8.25%
-    tax = round(subtotal * tax_rate, 2)
-    total = round(subtotal + tax, 2)
-    return {'subtotal': subtotal, 'tax': tax, 'total': total, 'tax_rate': tax_rate}
+    return totals_for(get_cart_summary(cart)['subtotal_cents'])
 
 
 @cart_bp.route('/cart')
@@ -37,77 +74,193 @@ def view_cart():
     return render_template('cart.html', cart=cart, totals=totals)
 
 
-@cart_bp.route('/cart/add', methods=['POST'])
-def add_to_cart():
-    """Add item to cart."""
-    data = request.json
+def parse_quantity(value):
+    """Quantity from a request, 1 to MAX_QUANTITY. Raises ValueError."""
+    try:
+        quantity = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('Invalid quantity')
+    if not 1 <= quantity <= MAX_QUANTITY:
+        raise ValueError(f'Quantity must be between 1 and {MAX_QUANTITY}')
+    return quantity
+
+
+def build_cart_item(data):
+    """A new cart line from add-to-cart data, with the preview rendered server-side. Raises LookupError/ValueError."""
     product_id = data.get('product_id')
-    size = data.get('size')
-    quantity = int(data.get('quantity', 1))
     logo_filename = data.get('logo_filename')
     logo_position = data.get('logo_position', {})
     preview_data_url = data.get('preview_data_url')
+    quantity = parse_quantity(data.get('quantity', 1))
 
     product = Product.query.get(product_id)
     if not product:
-        return jsonify({'error': 'Product not found'}), 404
-
-    cart = get_cart()
-
-    cart_item = {
+        raise LookupError('Product not found')
+
+    # Render the preview server-side; the client's canvas PNG (sent only when
+    # the server can't rasterize SVG) is the fallback
+    if logo_filename:
+        try:
+            preview_key = render_preview(product, get_logo_path(logo_filename), logo_position)
+        except Exception as e:
+            current_app.logger.error(f'Preview render error: {str(e)}')
+            preview_key = None
+        if preview_key:
+            preview_data_url = url_for('api.preview_image', key=preview_key)
+
+    return {
         'id': str(uuid.uuid4()),
         'product_id': product.id,
         'product_name': product.name,
         'category': product.category,
-        'size': size,
+        'size': data.get('size'),
         'quantity': quantity,
-        'unit_price': product.base_price,
-        'line_total': round(product.base_price * quantity, 2),
         'logo_filename': logo_filename,
         'logo_position': logo_position,
         'preview_data_url': preview_data_url,
         'image_url': product.image_url
     }
 
+
+@cart_bp.route('/cart/add', methods=['POST'])
+@rate_limit('cart')
+def add_to_cart():
+    """Add item to cart."""
+    try:
+        cart_item = build_cart_item(request.json)
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    cart = get_cart()
     cart.append(cart_item)
+    reprice_cart(cart, cart_item['product_id'])
     save_cart(cart)
 
     return jsonify({'success': True, 'cart_count': len(cart)})
 
 
 @cart_bp.route('/cart/update', methods=['POST'])
+@rate_limit('cart')
 def update_cart():
     """Update cart item quantity."""
     data = request.json
     item_id = data.get('item_id')
-    quantity = int(data.get('quantity', 1))
+    try:
+        quantity = parse_quantity(data.get('quantity', 1))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
     cart = get_cart()
+    changed = []
     for item in cart:
         if item['id'] == item_id:
             item['quantity'] = quantity
-            item['line_total'] = round(item['unit_price'] * quantity, 2)
+            changed = reprice_cart(cart, item['product_id'])
             break
 
     save_cart(cart)
     totals = calculate_totals(cart)
-    return jsonify({'success': True, 'totals': totals})
+    prices = {item['id']: {'unit_price': item['unit_price'], 'line_total': item['line_total']}
+              for item in cart if item['id'] in changed}
+    return jsonify({'success': True, 'totals': totals, 'prices': prices})
 
 
 @cart_bp.route('/cart/remove', methods=['POST'])
+@rate_limit('cart')
 def remove_from_cart():
     """Remove item from cart."""
     data = request.json
     item_id = data.get('item_id')
 
     cart = get_cart()
+    removed = [item for item in cart if item['id'] == item_id]
     cart = [item for item in cart if item['id'] != item_id]
+    if removed:
+        reprice_cart(cart, removed[0]['product_id'])
     save_cart(cart)
 
     totals = calculate_totals(cart)
     return jsonify({'success': True, 'cart_count': len(cart), 'totals': totals})
 
 
+@cart_bp.route('/cart/batch', methods=['POST'])
+@rate_limit('cart')
+def batch_cart():
+    """
+    Apply an ordered list of cart operations in one request, all or nothing.
+
+    Body: {"ops": [{"op": "add", ...add fields}, {"op": "update", "item_id", "quantity"},
+    {"op": "remove", "item_id"}]}. Each product is repriced once at the end,
+    and only lines that changed come back, with the new totals.
+    """
+    data = request.get_json(silent=True) or {}
+    ops = data.get('ops')
+    if not isinstance(ops, list) or not ops:
+        return jsonify({'error': 'No operations'}), 400
+    if len(ops) > MAX_BATCH_OPS:
+        return jsonify({'error': f'At most {MAX_BATCH_OPS} operations per batch'}), 400
+
+    # Work on copies so a failing operation leaves the session cart untouched
+    current = get_cart()
+    summary = get_cart_summary(current)
+    summary = dict(summary, products={key: list(value) for key, value in summary['products'].items()})
+    cart = [dict(item) for item in current]
+    items = {item['id']: item for item in cart}
+    touched, changed, removed, added = set(), set(), [], []
+
+    for index, op in enumerate(ops):
+        kind = op.get('op') if isinstance(op, dict) else None
+        try:
+            if kind == 'update':
+                item = items.get(op.get('item_id'))
+                if item is None:
+                    raise LookupError('Item not in cart')
+                item['quantity'] = parse_quantity(op.get('quantity'))
+                changed.add(item['id'])
+            elif kind == 'remove':
+                item = items.pop(op.get('item_id'), None)
+                if item is None:
+                    raise LookupError('Item not in cart')
+                changed.discard(item['id'])
+                removed.append(item['id'])
+            elif kind == 'add':
+                item = build_cart_item(op)
+                items[item['id']] = item
+                added.append(item)
+                changed.add(item['id'])
+            else:
+                raise ValueError(f'Unknown operation {kind!r}')
+        except (LookupError, ValueError) as e:
+            return jsonify({'error': str(e), 'index': index}), 400
+        touched.add(item['product_id'])
+
+    cart = [item for item in cart if item['id'] in items] + added
+    table = get_price_table()
+    if summary.get('version') != table.version:
+        summary = summarize_cart(cart, table)
+        changed.update(item['id'] for item in cart)
+    else:
+        for product_id in touched:
+            changed.update(reprice_product(cart, summary, product_id, table))
+        summary['lines'] = len(cart)
+    session['cart_summary'] = summary
+    save_cart(cart)
+
+    lines = {item['id']: {'quantity': item['quantity'], 'unit_price': item['unit_price'],
+                          'line_total': item['line_total']}
+             for item in cart if item['id'] in changed}
+    return jsonify({
+        'success': True,
+        'lines': lines,
+        'added': [item['id'] for item in added],
+        'removed': removed,
+        'cart_count': len(cart),
+        'totals': totals_for(summary['subtotal_cents'])
+    })
+
+
 @cart_bp.route('/checkout')
 def checkout():
     """Checkout page."""
@@ -126,29 +279,6 @@ def checkout():
     return render_template('checkout.html', cart=cart, totals=totals, paypal_client_id=paypal_client_id)
 
 
-def get_paypal_access_token():
-    """Get PayPal access token."""
-    paypal_mode = AdminSettings.get('paypal_mode', os.getenv('PAYPAL_MODE', 'sandbox'))
-
-    if paypal_mode == 'live':
-        api_base = 'https://api-m.paypal.com'
-        client_id = os.getenv('PAYPAL_LIVE_CLIENT_ID')
-        secret = os.getenv('PAYPAL_LIVE_SECRET')
-    else:
-        api_base = 'https://api-m.sandbox.paypal.com'
-        client_id = os.getenv('PAYPAL_SANDBOX_CLIENT_ID')
-        secret = os.getenv('PAYPAL_SANDBOX_SECRET')
-
-    response = requests.post(
-        f'{api_base}/v1/oauth2/token',
-        headers={'Accept': 'application/json'},
-        data={'grant_type': 'client_credentials'},
-        auth=(client_id, secret)
-    )
-    response.raise_for_status()
-    return response.json()['access_token'], api_base
-
-
 def generate_order_number():
     """Generate unique order number."""
     import random
@@ -159,6 +289,7 @@ def generate_order_number():
 
 
 @cart_bp.route('/api/paypal/create-order', methods=['POST'])
+@rate_limit('checkout')
 def create_paypal_order():
     """Create PayPal order."""
     cart = get_cart()
@@ -168,38 +299,7 @@ def create_paypal_order():
     totals = calculate_totals(cart)
 
     try:
-        access_token, api_base = get_paypal_access_token()
-
-        payload = {
-            'intent': 'CAPTURE',
-            'purchase_units': [{
-                'amount': {
-                    'currency_code': 'USD',
-                    'value': f"{totals['total']:.2f}",
-                    'breakdown': {
-                        'item_total': {'currency_code': 'USD', 'value': f"{totals['subtotal']:.2f}"},
-                        'tax_total': {'currency_code': 'USD', 'value': f"{totals['tax']:.2f}"}
-                    }
-                }
-            }],
-            'application_context': {
-                'brand_name': 'Let Me Mug You',
-                'user_action': 'PAY_NOW'
-            }
-        }
-
-        response = requests.post(
-            f'{api_base}/v2/checkout/orders',
-            headers={
-                'Content-Type': 'application/json',
-                'Authorization': f'Bearer {access_token}'
-            },
-            json=payload
-        )
-        response.raise_for_status()
-        data = response.json()
-        return jsonify({'orderID': data['id']})
-
+        return jsonify({'orderID': paypal.create_order(totals)})
     except requests.exceptions.HTTPError as e:
         current_app.logger.error(f'PayPal create order error: {e.response.text}')
         return jsonify({'error': 'Payment service error'}), 500
@@ -209,6 +309,7 @@ def create_paypal_order():
 
 
 @cart_bp.route('/api/paypal/capture-order', methods=['POST'])
+@rate_limit('checkout')
 def capture_paypal_order():
     """Capture PayPal order and create order in database."""
     data = request.json
@@ -220,18 +321,8 @@ def capture_paypal_order():
         return jsonify({'error': 'Cart is empty'}), 400
 
     try:
-        access_token, api_base = get_paypal_access_token()
-
         # Capture the payment
-        response = requests.post(
-            f'{api_base}/v2/checkout/orders/{paypal_order_id}/capture',
-            headers={
-                'Content-Type': 'application/json',
-                'Authorization': f'Bearer {access_token}'
-            }
-        )
-        response.raise_for_status()
-        capture_data = response.json()
+        capture_data = paypal.capture_order(paypal_order_id)
 
         if capture_data['status'] != 'COMPLETED':
             return jsonify({'error': 'Payment not completed'}), 400
@@ -275,12 +366,16 @@ def capture_paypal_order():
             order_item.set_position_data(item.get('logo_position', {}))
             db.session.add(order_item)
 
+        # Buffered for the admin digest in the same commit, so it can't be lost
+        queue_admin_notification(order, len(cart))
         db.session.commit()
 
         # Clear cart
         session.pop('cart', None)
+        session.pop('cart_summary', None)
 
-        # TODO: Send confirmation emails
+        # Send confirmation emails in the background so SMTP never holds up the response
+        send_order_emails_async(order)
 
         return jsonify({
             'success': True,
@@ -1,5 +1,7 @@
-from flask import Blueprint, render_template
-from models import Product
+from flask import Blueprint, render_template, jsonify, current_app
+from sqlalchemy import text
+from models import Product, db
+from utils.warmup import warm_up, warmup_status, is_ready
 
 main_bp = Blueprint('main', __name__)
 
@@ -21,3 +23,26 @@ def configurator():
     """Product configurator page."""
     products = Product.query.filter_by(active=True).all()
     return render_template('configurator.html', products=products)
+
+
+@main_bp.route('/healthz')
+def healthz():
+    """Liveness: the worker process is up and answering."""
+    return jsonify({'status': 'ok'})
+
+
+@main_bp.route('/readyz')
+def readyz():
+    """Readiness: 200 once this worker is warmed up and the database answers, else 503."""
+    status = warmup_status()
+    if status['state'] == 'cold':
+        # No post_worker_init hook ran (flask run, other servers): warm up on the first probe
+        warm_up(current_app._get_current_object())
+        status = warmup_status()
+    try:
+        db.session.execute(text('SELECT 1'))
+        status['database'] = 'ok'
+    except Exception as e:
+        status['database'] = str(e)
+    ready = is_ready() and status['database'] == 'ok'
+    return jsonify(status), 200 if ready else 503
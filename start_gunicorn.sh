@@ -3,7 +3,18 @@ set -a
 source /home/ubuntu/letmemugyou/.env
 set +a
 
+# Nginx forwards every request over the unix socket below, so trust its
+# X-Forwarded-For; otherwise per-IP rate limits see one client for everyone.
+export PROXY_COUNT="${PROXY_COUNT:-1}"
+
+# GUNICORN_WORKER_CLASS=gevent enables the async mode: PayPal and SMTP waits
+# yield to other requests instead of pinning a worker (requires gevent).
+# gunicorn.conf.py warms each worker up (templates, DB pool, image code) before
+# it accepts connections; /readyz reports the result.
 exec /home/ubuntu/letmemugyou/venv/bin/gunicorn \
-    --workers 3 \
+    --config /home/ubuntu/letmemugyou/gunicorn.conf.py \
+    --workers "${GUNICORN_WORKERS:-3}" \
+    --worker-class "${GUNICORN_WORKER_CLASS:-sync}" \
+    --worker-connections "${GUNICORN_WORKER_CONNECTIONS:-100}" \
     --bind unix:/home/ubuntu/letmemugyou/letmemugyou.sock \
     app:app
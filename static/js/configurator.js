@@ -48,12 +48,20 @@ document.addEventListener('DOMContentLoaded', function() {
     const modeRadios = document.querySelectorAll('input[name="logo-mode"]');
     modeRadios.forEach(radio => {
         radio.addEventListener('change', () => {
+            document.getElementById('dither-options').style.display =
+                getSelectedLogoMode() === 'dither' ? 'block' : 'none';
             if (originalLogoFile) {
                 handleFileUpload(originalLogoFile);
             }
         });
     });
 
+    document.getElementById('dither-select').addEventListener('change', () => {
+        if (originalLogoFile) {
+            handleFileUpload(originalLogoFile);
+        }
+    });
+
     // Check for category in URL
     const urlParams = new URLSearchParams(window.location.search);
     const category = urlParams.get('category');
@@ -86,7 +94,8 @@ function updateProduct() {
         id: parseInt(option.value),
         price: parseFloat(option.dataset.price),
         imageUrl: option.dataset.image,
-        sizes: JSON.parse(option.dataset.sizes || '[]')
+        sizes: JSON.parse(option.dataset.sizes || '[]'),
+        tiers: JSON.parse(option.dataset.tiers || '[]')
     };
 
     // Update size options
@@ -119,7 +128,9 @@ function loadProductImage(imageUrl) {
     canvas.clear();
     canvas.backgroundColor = '#f5f5f5';
 
-    fabric.Image.fromURL(imageUrl, function(img) {
+    // Product images ship inside the asset bundle; fall back to fetching the file
+    const source = (window.PRODUCT_IMAGES || {})[imageUrl] || imageUrl;
+    fabric.Image.fromURL(source, function(img) {
         // Scale to fit canvas
         const scale = Math.min(
             (canvas.width - 40) / img.width,
@@ -178,6 +189,10 @@ function handleFileUpload(file) {
     const formData = new FormData();
     formData.append('logo', file);
     formData.append('mode', mode);
+    formData.append('dither', document.getElementById('dither-select').value);
+    if (mode === 'remove_bg_connected') {
+        formData.append('feather', 1);  // Soften the cut edge slightly
+    }
 
     fetch('/api/upload-logo', {
         method: 'POST',
@@ -290,10 +305,20 @@ function deleteSelected() {
     }
 }
 
+function unitPriceFor(product, quantity) {
+    // Tiers are sorted by min_quantity; the last one reached wins
+    let price = product.price;
+    product.tiers.forEach(tier => {
+        if (quantity >= tier.min_quantity) price = tier.unit_price;
+    });
+    return price;
+}
+
 function updatePrice() {
     const quantity = parseInt(document.getElementById('quantity').value) || 1;
-    const unitPrice = currentProduct ? currentProduct.price : 0;
-    const total = unitPrice * quantity;
+    const unitPrice = currentProduct ? unitPriceFor(currentProduct, quantity) : 0;
+    // Work in cents so the display matches the server's totals
+    const total = Math.round(unitPrice * 100) * quantity / 100;
 
     document.getElementById('unit-price').textContent = '$' + unitPrice.toFixed(2);
     document.getElementById('qty-display').textContent = quantity;
@@ -338,9 +363,12 @@ function addToCart() {
         size: sizeSelect.value || null,
         quantity: quantity,
         logo_filename: uploadedLogoFilename,
-        logo_position: getLogoPosition(),
-        preview_data_url: getPreviewDataUrl()
+        logo_position: getLogoPosition()  // Preview is rendered server-side from this
     };
+    // Without cairosvg the server can't draw SVG products or logos, so send the canvas as a fallback
+    if (document.getElementById('preview-canvas').dataset.serverSvgPreviews !== 'true') {
+        data.preview_data_url = getPreviewDataUrl();
+    }
 
     fetch('/cart/add', {
         method: 'POST',
@@ -0,0 +1,18 @@
+import os
+import re
+from types import SimpleNamespace
+from utils.files import FILE_ROOTS
+
+README = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'README.md')
+APP_ROOT = '/home/ubuntu/letmemugyou'  # Where the README's Nginx examples install the app
+LOCATION = re.compile(r'location /_protected/(\w+)/ \{\s*internal;\s*alias ([^;]+);\s*\}')
+
+
+def test_every_file_root_has_a_documented_internal_location():
+    with open(README, encoding='utf-8') as f:
+        locations = dict(LOCATION.findall(f.read()))
+    app = SimpleNamespace(root_path=APP_ROOT, instance_path=os.path.join(APP_ROOT, 'instance'))
+
+    assert set(locations) == set(FILE_ROOTS)
+    for root, folder in FILE_ROOTS.items():
+        assert locations[root].rstrip('/') == folder(app), root
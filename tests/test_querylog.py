@@ -0,0 +1,39 @@
+import os
+from flask import Flask
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+from utils.querylog import init_query_log, slow_query_report
+
+# Cheap to prepare, slow to fetch: SQLite steps to the first row in execute()
+# and produces the other rows as they are fetched
+FETCH_BOUND_SELECT = text('WITH RECURSIVE numbers(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM numbers '
+                          'WHERE n < 300000) SELECT n FROM numbers')
+
+
+def make_app(tmp_path, threshold_ms):
+    app = Flask(__name__, instance_path=str(tmp_path))
+    app.config.update(QUERYLOG_ENABLED=True, QUERYLOG_THRESHOLD_MS=threshold_ms, QUERYLOG_SAMPLE_RATE=1)
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    init_query_log(app, engine)
+    return app, engine
+
+
+def test_fetch_bound_select_is_logged(tmp_path):
+    app, engine = make_app(tmp_path, threshold_ms=20)
+    with Session(engine) as session:
+        rows = session.execute(FETCH_BOUND_SELECT).all()
+    assert len(rows) == 300000
+
+    report = slow_query_report(os.path.join(app.instance_path, 'querylog.db'))
+    assert len(report) == 1
+    assert report[0]['statement'].endswith('SELECT n FROM numbers')
+    assert report[0]['count'] == 1
+    assert report[0]['total_ms'] >= 20
+    assert 'SCAN' in report[0]['plan']
+
+
+def test_fast_select_is_not_logged(tmp_path):
+    app, engine = make_app(tmp_path, threshold_ms=1000)
+    with Session(engine) as session:
+        assert session.execute(text('SELECT 1')).scalar() == 1
+    assert slow_query_report(os.path.join(app.instance_path, 'querylog.db')) == []
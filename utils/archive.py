@@ -0,0 +1,213 @@
+"""
+Order archive for Let Me Mug You.
+Orders shipped long ago are moved out of the live tables into one SQLite
+file per order month (instance/archive/orders-YYYY-MM.db, same schema), so
+admin queries only ever touch recent orders. A small index table in the
+main database keeps archived orders findable.
+"""
+import os
+import base64
+import hashlib
+from io import BytesIO
+from datetime import datetime, timedelta
+from PIL import Image
+from flask import current_app
+from sqlalchemy import create_engine, select, delete, func
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.pool import NullPool
+from models import Order, OrderItem, ArchivedOrder, ArchiveMonth, add_missing_columns, db
+from utils.preview import get_preview_folder
+from utils.uploads import PREVIEW_URL_PREFIX
+
+DEFAULT_ARCHIVE_DAYS = 180
+ARCHIVE_BATCH_SIZE = 500
+
+_engines = {}
+
+
+def get_archive_folder():
+    folder = os.path.join(current_app.instance_path, 'archive')
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def get_archive_engine(month):
+    """Engine for one month's archive file, creating the file and tables on first use."""
+    path = os.path.join(get_archive_folder(), f'orders-{month}.db')
+    engine = _engines.get(path)
+    if engine is None:
+        # NullPool: archive reads are rare, and no connection survives a worker fork
+        engine = create_engine(f'sqlite:///{path}', poolclass=NullPool)
+        db.metadata.create_all(engine, tables=[Order.__table__, OrderItem.__table__])
+        with engine.begin() as connection:
+            add_missing_columns(connection, [Order.__table__, OrderItem.__table__])
+        _engines[path] = engine
+    return engine
+
+
+def archive_months(start=None, end=None):
+    """Archived months (YYYY-MM), oldest first, optionally limited to a date range."""
+    query = db.session.query(ArchiveMonth.month).filter(ArchiveMonth.orders > 0)
+    if start:
+        query = query.filter(ArchiveMonth.month >= start.strftime('%Y-%m'))
+    if end:
+        query = query.filter(ArchiveMonth.month <= end.strftime('%Y-%m'))
+    return [month for (month,) in query.order_by(ArchiveMonth.month)]
+
+
+def archive_sessions(start=None, end=None):
+    """Yield a read session for each archive month in range, closing it once the caller moves on."""
+    for month in archive_months(start, end):
+        with Session(get_archive_engine(month)) as session:
+            yield session
+
+
+def order_sessions(include_archived=True, start=None, end=None):
+    """Sessions to read orders from: archived months oldest first, then the live tables."""
+    if include_archived:
+        yield from archive_sessions(start, end)
+    yield db.session
+
+
+def load_archived_order(order_id):
+    """An archived Order with its items loaded (detached, read-only), or None."""
+    stub = db.session.get(ArchivedOrder, order_id)
+    if stub is None:
+        return None
+    with Session(get_archive_engine(stub.archive_month)) as session:
+        return session.query(Order).options(selectinload(Order.items)).filter(Order.id == order_id).first()
+
+
+def _externalize_preview(value):
+    """Turn a legacy base64 data URL into a cached preview file; returns its URL."""
+    if not value or not value.startswith('data:image/'):
+        return value
+    try:
+        data = base64.b64decode(value.split(',', 1)[1])
+        key = hashlib.sha1(data).hexdigest()
+        path = os.path.join(get_preview_folder(), f'{key}.png')
+        if not os.path.exists(path):
+            with Image.open(BytesIO(data)) as img:
+                tmp_path = f'{path}.{os.getpid()}.tmp'
+                img.save(tmp_path, 'PNG')
+            os.replace(tmp_path, path)
+    except Exception:
+        return value
+    return f'{PREVIEW_URL_PREFIX}{key}.png'
+
+
+def _month_of(order_date):
+    return (order_date or datetime.utcnow()).strftime('%Y-%m')
+
+
+def _archive_batch(order_rows):
+    """Copy a batch of orders to their month files, then remove them from the live tables."""
+    orders_table, items_table = Order.__table__, OrderItem.__table__
+    ids = [row.id for row in order_rows]
+
+    orders = [dict(row) for row in db.session.execute(
+        select(orders_table).where(orders_table.c.id.in_(ids))).mappings()]
+    items = [dict(row) for row in db.session.execute(
+        select(items_table).where(items_table.c.order_id.in_(ids))).mappings()]
+
+    by_month = {}
+    for order in orders:
+        by_month.setdefault(_month_of(order['order_date']), ([], []))[0].append(order)
+    month_of_order = {order['id']: _month_of(order['order_date']) for order in orders}
+    item_counts = {}
+    for item in items:
+        item['preview_data_url'] = _externalize_preview(item['preview_data_url'])
+        by_month[month_of_order[item['order_id']]][1].append(item)
+        item_counts[item['order_id']] = item_counts.get(item['order_id'], 0) + 1
+
+    # Archive files are written (and committed) first; INSERT OR REPLACE makes
+    # a re-run after a crash between the two commits harmless
+    for month, (month_orders, month_items) in by_month.items():
+        with get_archive_engine(month).begin() as conn:
+            conn.execute(orders_table.insert().prefix_with('OR REPLACE'), month_orders)
+            if month_items:
+                conn.execute(items_table.insert().prefix_with('OR REPLACE'), month_items)
+
+    db.session.execute(ArchivedOrder.__table__.insert().prefix_with('OR REPLACE'), [{
+        'id': order['id'],
+        'order_number': order['order_number'],
+        'order_date': order['order_date'],
+        'customer_name': order['customer_name'],
+        'email': order['email'],
+        'business_name': order['business_name'],
+        'status': order['status'],
+        'payment_status': order['payment_status'],
+        'total': order['total'] or 0,
+        'item_count': item_counts.get(order['id'], 0),
+        'archive_month': month_of_order[order['id']],
+    } for order in orders])
+    db.session.execute(delete(items_table).where(items_table.c.order_id.in_(ids)))
+    db.session.execute(delete(orders_table).where(orders_table.c.id.in_(ids)))
+
+    for month in by_month:
+        count, item_total, revenue = db.session.query(
+            func.count(ArchivedOrder.id),
+            func.coalesce(func.sum(ArchivedOrder.item_count), 0),
+            func.coalesce(func.sum(db.case((ArchivedOrder.payment_status == 'paid', ArchivedOrder.total),
+                                           else_=0)), 0),
+        ).filter(ArchivedOrder.archive_month == month).one()
+        summary = db.session.get(ArchiveMonth, month) or ArchiveMonth(month=month)
+        summary.orders, summary.items, summary.paid_revenue = count, item_total, revenue
+        db.session.add(summary)
+    db.session.commit()
+    return len(orders), len(items), sorted(by_month)
+
+
+def archive_orders(days=DEFAULT_ARCHIVE_DAYS, batch_size=ARCHIVE_BATCH_SIZE, dry_run=False):
+    """
+    Move orders shipped more than `days` ago into the monthly archive files.
+
+    Orders shipped before shipped_at was recorded have none; for those the
+    order date stands in, which can only make them look older. Returns a
+    stats dict.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    # Never archive the newest order: SQLite would hand its id out again
+    newest_id = db.session.query(func.max(Order.id)).scalar() or 0
+    query = (db.session.query(Order.id, Order.order_date)
+             .filter(Order.status == 'shipped',
+                     func.coalesce(Order.shipped_at, Order.order_date) < cutoff,
+                     Order.id < newest_id)
+             .order_by(Order.id))
+
+    stats = {'orders': 0, 'items': 0, 'months': set()}
+    if dry_run:
+        rows = query.all()
+        stats['orders'] = len(rows)
+        stats['months'] = {_month_of(row.order_date) for row in rows}
+        return stats
+
+    while True:
+        batch = query.limit(batch_size).all()
+        if not batch:
+            break
+        orders, items, months = _archive_batch(batch)
+        stats['orders'] += orders
+        stats['items'] += items
+        stats['months'].update(months)
+    return stats
+
+
+def archived_totals():
+    """(orders, paid revenue) across all archive months."""
+    orders, revenue = db.session.query(func.coalesce(func.sum(ArchiveMonth.orders), 0),
+                                       func.coalesce(func.sum(ArchiveMonth.paid_revenue), 0)).one()
+    return orders, revenue
+
+
+def search_archived_orders(search, limit=50):
+    """Archived orders matching an order number, name or email."""
+    return (ArchivedOrder.query
+            .filter(db.or_(
+                ArchivedOrder.order_number.ilike(f'%{search}%'),
+                ArchivedOrder.customer_name.ilike(f'%{search}%'),
+                ArchivedOrder.email.ilike(f'%{search}%')
+            ))
+            .order_by(ArchivedOrder.order_date.desc())
+            .limit(limit)
+            .all())
@@ -0,0 +1,163 @@
+"""
+Static asset bundle for Let Me Mug You.
+Built once at startup into static/dist/: minified CSS, and one configurator
+bundle holding the product SVGs (inlined as data URIs), a vendored Fabric.js
+when present, and the minified configurator script. Files are named by
+content hash so they can be cached forever, and written next to .gz (and
+.br, with the optional brotli package) copies for Nginx's gzip_static.
+"""
+import os
+import re
+import gzip
+import json
+import time
+import hashlib
+from urllib.parse import quote
+from flask import url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DIST_FOLDER = 'dist'
+STALE_AFTER = 7 * 24 * 3600  # Old bundles are kept this long for pages rendered before a deploy
+
+_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.DOTALL)
+_CSS_SPACE = re.compile(r'\s*([{};,>])\s*')
+_CSS_COLON = re.compile(r':\s+')
+_SVG_COMMENT = re.compile(r'<!--.*?-->', re.DOTALL)
+_SVG_DECLARATION = re.compile(r'<\?xml.*?\?>', re.DOTALL)
+_BETWEEN_TAGS = re.compile(r'>\s+<')
+
+
+def minify_css(css):
+    css = _CSS_COMMENT.sub('', css)
+    css = _CSS_SPACE.sub(r'\1', css)
+    css = _CSS_COLON.sub(':', css)
+    return re.sub(r'\s+', ' ', css).replace(';}', '}').strip()
+
+
+def minify_js(source):
+    """
+    Strip comments and indentation, keeping line breaks (so automatic
+    semicolon insertion still works). Strings and template literals are
+    copied untouched; the scripts here don't use regex literals.
+    """
+    out = []
+    i, length = 0, len(source)
+    while i < length:
+        char = source[i]
+        if char in '\'"`':
+            end = i + 1
+            while end < length and source[end] != char:
+                end += 2 if source[end] == '\\' else 1
+            out.append(source[i:end + 1])
+            i = end + 1
+        elif source.startswith('//', i):
+            end = source.find('\n', i)
+            i = length if end == -1 else end
+        elif source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            i = length if end == -1 else end + 2
+        else:
+            out.append(char)
+            i += 1
+    lines = (line.strip() for line in ''.join(out).splitlines())
+    return '\n'.join(line for line in lines if line) + '\n'
+
+
+def minify_svg(svg):
+    svg = _SVG_DECLARATION.sub('', _SVG_COMMENT.sub('', svg))
+    return re.sub(r'\s+', ' ', _BETWEEN_TAGS.sub('><', svg)).strip()
+
+
+def svg_data_uri(svg):
+    return 'data:image/svg+xml;charset=utf-8,' + quote(minify_svg(svg), safe=' =:/;,"\'<>')
+
+
+def product_images(static_folder):
+    """Product SVGs keyed by their /static URL, as data URIs."""
+    folder = os.path.join(static_folder, 'products')
+    images = {}
+    for name in sorted(os.listdir(folder)) if os.path.isdir(folder) else []:
+        if name.endswith('.svg'):
+            with open(os.path.join(folder, name), encoding='utf-8') as f:
+                images[f'/static/products/{name}'] = svg_data_uri(f.read())
+    return images
+
+
+def _read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def _write_bundle(dist, name, ext, content):
+    """Write content (plus compressed copies) under a content-hashed name; returns the file name."""
+    data = content.encode('utf-8')
+    filename = f'{name}.{hashlib.sha1(data).hexdigest()[:10]}.{ext}'
+    path = os.path.join(dist, filename)
+    variants = [(path, data), (f'{path}.gz', gzip.compress(data, 9, mtime=0))]
+    if brotli is not None:
+        variants.append((f'{path}.br', brotli.compress(data)))
+    for variant_path, variant_data in variants:
+        if os.path.exists(variant_path):
+            continue  # Same hash, same bytes: another worker already wrote it
+        tmp_path = f'{variant_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(variant_data)
+        os.replace(tmp_path, variant_path)
+    return filename
+
+
+def _prune(dist, keep):
+    cutoff = time.time() - STALE_AFTER
+    for name in os.listdir(dist):
+        if name.split('.gz')[0].split('.br')[0] not in keep and os.path.getmtime(os.path.join(dist, name)) < cutoff:
+            try:
+                os.remove(os.path.join(dist, name))
+            except OSError:
+                pass
+
+
+def build_assets(app):
+    """Build the bundles and return the manifest {source path: dist path}."""
+    static = app.static_folder
+    dist = os.path.join(static, DIST_FOLDER)
+    os.makedirs(dist, exist_ok=True)
+
+    manifest = {}
+    manifest['css/style.css'] = _write_bundle(dist, 'style', 'css', minify_css(_read(os.path.join(static, 'css', 'style.css'))))
+
+    parts = []
+    fabric_path = os.path.join(static, 'vendor', 'fabric.min.js')
+    if os.path.exists(fabric_path):
+        parts.append(_read(fabric_path).rstrip() + '\n;')
+        manifest['vendor/fabric.min.js'] = None  # Inside the configurator bundle
+    parts.append(f'window.PRODUCT_IMAGES = {json.dumps(product_images(static), separators=(",", ":"))};\n')
+    parts.append(minify_js(_read(os.path.join(static, 'js', 'configurator.js'))))
+    manifest['js/configurator.js'] = _write_bundle(dist, 'configurator', 'js', ''.join(parts))
+
+    _prune(dist, {name for name in manifest.values() if name})
+    return {source: f'{DIST_FOLDER}/{name}' if name else None for source, name in manifest.items()}
+
+
+def init_assets(app):
+    """Build the bundles (if ASSET_BUNDLE is on) and expose asset_url()/asset_bundled() to templates."""
+    manifest = {}
+    if app.config.get('ASSET_BUNDLE', True):
+        try:
+            manifest = build_assets(app)
+        except OSError as e:
+            app.logger.error(f'Asset bundle build failed, serving source files: {str(e)}')
+    app.extensions['asset_manifest'] = manifest
+
+    def asset_url(filename):
+        """URL of the bundled file for a static source path, or the source itself."""
+        return url_for('static', filename=manifest.get(filename) or filename)
+
+    def asset_bundled(filename):
+        """True if filename is served from inside another bundle (so no tag is needed)."""
+        return filename in manifest and manifest[filename] is None
+
+    app.jinja_env.globals.update(asset_url=asset_url, asset_bundled=asset_bundled)
@@ -0,0 +1,329 @@
+"""
+Bulk personalized orders for business customers.
+A CSV of per-item names and/or logo references is validated in one
+streaming pass, the engraving variants are rendered in a process pool off
+the request thread, and the order is written with a single batched insert.
+"""
+import io
+import os
+import csv
+import json
+import time
+import uuid
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from PIL import Image, ImageFont, ImageDraw
+from flask import current_app
+from sqlalchemy import insert
+from models import Product, Order, OrderItem, db
+from utils.pricing import to_dollars
+from utils.uploads import get_logo_path, get_upload_folder, shard_for, PREVIEW_URL_PREFIX
+from utils.preview import (load_image, normalize_transform, render_preview_file, get_preview_folder,
+                           product_image_path, cairosvg)
+
+MAX_ROWS = 1000
+MAX_ERRORS = 20  # Stop reading once the file is clearly wrong
+MAX_TEXT_LENGTH = 60
+MAX_QUANTITY = 500
+DEFAULT_FONT_SIZE = 48
+PROGRESS_EVERY = 25  # Rendered items between job-file updates
+STALE_JOB_AFTER = 1800  # Seconds without a job-file update before a queued/rendering job is presumed dead
+
+_coordinator = None
+_pool = None
+_pool_workers = 1
+_lock = threading.Lock()
+
+
+def parse_bulk_csv(stream, product, default_size='', shared_logo=''):
+    """
+    Validate a bulk order CSV in a single streaming pass.
+
+    Each row needs a text value, a logo reference (a filename returned by the
+    logo upload API) or a shared logo. Returns (rows, errors) where errors are
+    human-readable strings with line numbers.
+    """
+    rows, errors = [], []
+    sizes = product.get_sizes()
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+
+    try:
+        header = [name.strip().lower() for name in reader.fieldnames or []]
+    except UnicodeDecodeError:
+        return [], ['CSV must be UTF-8 encoded']
+    if not set(header) & {'text', 'logo'}:
+        return [], ['CSV needs a "text" or "logo" column']
+    reader.fieldnames = header
+
+    try:
+        for record in reader:
+            line = reader.line_num
+            if len(rows) >= MAX_ROWS:
+                errors.append(f'More than {MAX_ROWS} items - split the order')
+                break
+            if len(errors) >= MAX_ERRORS:
+                errors.append('Too many errors, stopped checking')
+                break
+
+            text = (record.get('text') or '').strip()
+            logo = (record.get('logo') or '').strip() or shared_logo
+            size = (record.get('size') or '').strip() or default_size
+            if not text and not logo:
+                if not any((value or '').strip() for value in record.values() if isinstance(value, str)):
+                    continue  # Blank line
+                errors.append(f'Line {line}: needs text or a logo')
+                continue
+            if len(text) > MAX_TEXT_LENGTH:
+                errors.append(f'Line {line}: text longer than {MAX_TEXT_LENGTH} characters')
+                continue
+            if logo:
+                logo_path = get_logo_path(logo)
+                if not logo_path or os.path.basename(logo_path) != logo or not os.path.isfile(logo_path):
+                    errors.append(f'Line {line}: unknown logo "{logo}"')
+                    continue
+                if text and logo.lower().endswith('.svg') and cairosvg is None:
+                    errors.append(f'Line {line}: SVG logos cannot be combined with text on this server')
+                    continue
+            try:
+                quantity = int((record.get('quantity') or '1').strip())
+            except ValueError:
+                errors.append(f'Line {line}: quantity must be a whole number')
+                continue
+            if not 1 <= quantity <= MAX_QUANTITY:
+                errors.append(f'Line {line}: quantity must be between 1 and {MAX_QUANTITY}')
+                continue
+            if sizes and size not in sizes:
+                errors.append(f'Line {line}: size must be one of {", ".join(sizes)}')
+                continue
+
+            rows.append({'text': text, 'logo': logo, 'quantity': quantity, 'size': size})
+    except (UnicodeDecodeError, csv.Error) as e:
+        errors.append(f'Line {reader.line_num}: unreadable CSV ({e})')
+
+    if not rows and not errors:
+        errors.append('CSV has no items')
+    return rows, errors
+
+
+def variant_filename(logo, text, font_size):
+    """Deterministic name for a personalized variant, so repeated names render once."""
+    digest = hashlib.sha1(json.dumps([logo, text, font_size]).encode('utf-8')).hexdigest()
+    return f'{digest[:32]}_bulk.png'
+
+
+def _font(font_path, font_size):
+    if font_path:
+        return ImageFont.truetype(font_path, font_size)
+    return ImageFont.load_default(font_size)
+
+
+def render_variant(logo_path, text, font_path, font_size, output_path):
+    """Engraving artwork: the logo (if any) with the text centered underneath, black on transparent."""
+    logo = load_image(logo_path) if logo_path else None
+    text_layer = None
+    if text:
+        font = _font(font_path, font_size)
+        left, top, right, bottom = font.getbbox(text)
+        text_layer = Image.new('RGBA', (max(1, right - left), max(1, bottom - top)), (0, 0, 0, 0))
+        ImageDraw.Draw(text_layer).text((-left, -top), text, font=font, fill=(0, 0, 0, 255))
+
+    layers = [layer for layer in (logo, text_layer) if layer is not None]
+    gap = font_size // 2 if len(layers) == 2 else 0
+    width = max(layer.width for layer in layers)
+    height = sum(layer.height for layer in layers) + gap
+    canvas = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    y = 0
+    for layer in layers:
+        canvas.alpha_composite(layer, dest=((width - layer.width) // 2, y))
+        y += layer.height + gap
+
+    # optimize=True triples the cost per item; these files are small anyway
+    tmp_path = f'{output_path}.{os.getpid()}.tmp'
+    canvas.save(tmp_path, 'PNG')
+    os.replace(tmp_path, output_path)
+
+
+def _render_task(task):
+    """Process-pool entry point: render one variant and its preview. Needs no app context."""
+    logo_path = task['logo_path']
+    if task['text']:
+        if not os.path.exists(task['variant_path']):
+            os.makedirs(os.path.dirname(task['variant_path']), exist_ok=True)
+            render_variant(task['logo_path'], task['text'], task['font_path'], task['font_size'],
+                           task['variant_path'])
+        logo_path = task['variant_path']
+    preview_key = render_preview_file(task['preview_folder'], task['product_id'], task['image_url'],
+                                      task['product_path'], logo_path, task['transform'], optimize=False)
+    return task['index'], preview_key
+
+
+def get_bulk_folder():
+    folder = os.path.join(current_app.instance_path, 'bulk_jobs')
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def save_job(job):
+    path = os.path.join(get_bulk_folder(), f"{job['job_id']}.json")
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(job, f)
+    os.replace(tmp_path, path)
+
+
+def load_job(job_id):
+    """Job status dict, readable from any worker, or None."""
+    path = os.path.join(get_bulk_folder(), f'{job_id}.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        job = json.load(f)
+    # A running job rewrites its file every PROGRESS_EVERY items, so a long
+    # silence means the worker running it was restarted or killed
+    if job['status'] in ('queued', 'rendering') and time.time() - os.path.getmtime(path) > STALE_JOB_AFTER:
+        job.update(status='failed', error='Interrupted (the worker running this job stopped)')
+        save_job(job)
+    return job
+
+
+def list_bulk_jobs(limit=20):
+    """Most recent bulk jobs first."""
+    folder = get_bulk_folder()
+    names = sorted((name for name in os.listdir(folder) if name.endswith('.json')),
+                   key=lambda name: os.path.getmtime(os.path.join(folder, name)), reverse=True)
+    return [job for job in (load_job(name[:-5]) for name in names[:limit]) if job]
+
+
+def _get_pool():
+    """Rendering processes, started once per web worker and reused."""
+    global _coordinator, _pool, _pool_workers
+    with _lock:
+        if _pool is None:
+            _pool_workers = current_app.config.get('BULK_RENDER_WORKERS') or min(4, os.cpu_count() or 1)
+            # forkserver children start clean instead of inheriting the web worker's threads
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _pool = ProcessPoolExecutor(max_workers=_pool_workers, mp_context=multiprocessing.get_context(method))
+            _coordinator = ThreadPoolExecutor(max_workers=1, thread_name_prefix='bulk')
+    return _coordinator, _pool
+
+
+def _reset_pool():
+    """Drop a broken pool (a render process died) so the next job starts a fresh one."""
+    global _pool
+    with _lock:
+        broken, _pool = _pool, None
+    if broken is not None:
+        broken.shutdown(wait=False, cancel_futures=True)
+
+
+def start_bulk_order(order_number, customer, product, layout, rows, totals):
+    """
+    Queue a bulk order. Rendering and the insert happen in the background.
+
+    layout has size, logo_position and font_size. Returns the job dict.
+    """
+    job = {
+        'job_id': uuid.uuid4().hex[:12],
+        'status': 'queued',
+        'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'customer': customer.get('business_name') or customer.get('customer_name', ''),
+        'product': product.name,
+        'items': len(rows),
+        'rendered': 0,
+        'order_id': None,
+        'order_number': order_number,
+        'error': None,
+    }
+    save_job(job)
+
+    coordinator, _ = _get_pool()
+    app = current_app._get_current_object()
+    coordinator.submit(_run_job, app, job, order_number, customer, product.id, layout, rows, totals)
+    return job
+
+
+def _build_tasks(app, product, layout, rows):
+    font_path = app.config.get('BULK_FONT_PATH')
+    font_size = int(layout.get('font_size') or DEFAULT_FONT_SIZE)
+    transform = normalize_transform(layout.get('logo_position'))
+    preview_folder = get_preview_folder()
+    product_path = product_image_path(app.root_path, product.image_url)
+    upload_folder = get_upload_folder()
+
+    tasks = []
+    for index, row in enumerate(rows):
+        variant = variant_filename(row['logo'], row['text'], font_size) if row['text'] else row['logo']
+        row['logo_filename'] = variant
+        tasks.append({
+            'index': index,
+            'text': row['text'],
+            'logo_path': get_logo_path(row['logo']) if row['logo'] else None,
+            'variant_path': os.path.join(upload_folder, shard_for(variant), variant),
+            'font_path': font_path,
+            'font_size': font_size,
+            'preview_folder': preview_folder,
+            'product_id': product.id,
+            'image_url': product.image_url,
+            'product_path': product_path,
+            'transform': transform,
+        })
+    return tasks, transform
+
+
+def _run_job(app, job, order_number, customer, product_id, layout, rows, totals):
+    with app.app_context():
+        try:
+            # Fetched here, not when queued, so a job queued behind one that broke the pool gets a fresh one
+            _, pool = _get_pool()
+            product = db.session.get(Product, product_id)
+            tasks, transform = _build_tasks(app, product, layout, rows)
+            job['status'] = 'rendering'
+            save_job(job)
+
+            started = time.perf_counter()
+            chunksize = max(1, len(tasks) // (_pool_workers * 4))
+            for index, preview_key in pool.map(_render_task, tasks, chunksize=chunksize):
+                rows[index]['preview_key'] = preview_key
+                job['rendered'] += 1
+                if job['rendered'] % PROGRESS_EVERY == 0:
+                    save_job(job)
+            job['render_seconds'] = round(time.perf_counter() - started, 2)
+
+            order = Order(
+                order_number=order_number,
+                subtotal=totals['subtotal'],
+                tax=totals['tax'],
+                total=totals['total'],
+                payment_status='pending',
+                **customer
+            )
+            db.session.add(order)
+            db.session.flush()  # Get order ID
+
+            position_data = json.dumps(transform)
+            db.session.execute(insert(OrderItem), [{
+                'order_id': order.id,
+                'product_id': product.id,
+                'product_name': product.name,
+                'size': row['size'],
+                'quantity': row['quantity'],
+                'unit_price': to_dollars(row['unit_cents']),
+                'line_total': to_dollars(row['line_cents']),
+                'logo_filename': row['logo_filename'],
+                'logo_position_data': position_data,
+                'preview_data_url': f"{PREVIEW_URL_PREFIX}{row['preview_key']}.png" if row['preview_key'] else None,
+            } for row in rows])
+            db.session.commit()
+
+            job.update(status='done', order_id=order.id)
+        except Exception as e:
+            db.session.rollback()
+            if isinstance(e, BrokenProcessPool):
+                _reset_pool()
+            # repr, since some errors (BrokenProcessPool among them) can have an empty message
+            current_app.logger.error(f"Bulk order {job['job_id']} failed: {repr(e)}")
+            job.update(status='failed', error=repr(e))
+        save_job(job)
@@ -5,10 +5,18 @@ Currently stubbed - will send emails when SMTP is configured.
 import os
 import smtplib
 import ssl
+import threading
+from html import escape
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from flask import current_app
 
+# Background senders so SMTP latency never blocks a request (greenlets under gevent)
+EMAIL_WORKERS = 2
+_executor = None
+_executor_lock = threading.Lock()
+
 
 def send_email(to_email, subject, html_body, text_body=None):
     """
@@ -144,28 +152,148 @@ def send_order_confirmation(order):
     return send_email(order.email, subject, html_body)
 
 
-def send_admin_notification(order):
-    """Send new order notification to admin."""
+def send_status_update(order, status):
+    """Tell the customer their order has moved to a new status (currently: shipped)."""
+    subject = f"Your Order Has Shipped - {order.order_number}"
+
+    html_body = f"""
+    <html>
+    <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
+        <div style="background: #2c3e50; color: white; padding: 20px; text-align: center;">
+            <h1 style="margin: 0;">&#9749; Let Me Mug You</h1>
+        </div>
+
+        <div style="padding: 30px;">
+            <h2>Your order is on its way!</h2>
+            <p>Hi {order.customer_name},</p>
+            <p>Order <strong>{order.order_number}</strong> has been marked {status} and is heading to:</p>
+            <p>
+                {order.address_line1}<br>
+                {(order.address_line2 + '<br>') if order.address_line2 else ''}
+                {order.city}, {order.state} {order.zip_code}
+            </p>
+
+            <p style="margin-top: 30px;">
+                If you have any questions, please reply to this email.
+            </p>
+
+            <p>Thank you for choosing Let Me Mug You!</p>
+        </div>
+    </body>
+    </html>
+    """
+
+    return send_email(order.email, subject, html_body)
+
+
+def send_admin_digest(notifications):
+    """Send one email covering a batch of buffered new orders (see utils/notifications.py)."""
     from models import AdminSettings
 
     admin_email = AdminSettings.get('admin_email')
     if not admin_email:
-        current_app.logger.info("No admin email configured - skipping admin notification")
+        current_app.logger.info("No admin email configured - skipping admin digest")
         return True
 
-    subject = f"New Order: {order.order_number}"
+    total = sum(n.total or 0 for n in notifications)
+    if len(notifications) == 1:
+        subject = f"New Order: {notifications[0].order_number}"
+    else:
+        subject = f"{len(notifications)} New Orders (${total:.2f})"
+
+    rows_html = ""
+    for n in notifications:
+        rows_html += f"""
+        <tr>
+            <td style="padding: 6px; border-bottom: 1px solid #eee;"><a href="https://letmemugyou.com/admin/orders/{n.order_id}">{escape(n.order_number)}</a></td>
+            <td style="padding: 6px; border-bottom: 1px solid #eee;">{escape(n.customer_name or '')} ({escape(n.email or '')}){(' - ' + escape(n.business_name)) if n.business_name else ''}</td>
+            <td style="padding: 6px; border-bottom: 1px solid #eee;">{n.item_count}</td>
+            <td style="padding: 6px; border-bottom: 1px solid #eee;">${n.total:.2f}</td>
+        </tr>
+        """
 
     html_body = f"""
     <html>
     <body style="font-family: Arial, sans-serif;">
-        <h2>New Order Received</h2>
-        <p><strong>Order Number:</strong> {order.order_number}</p>
-        <p><strong>Customer:</strong> {order.customer_name} ({order.email})</p>
-        <p><strong>Total:</strong> ${order.total:.2f}</p>
-        <p><strong>Items:</strong> {len(order.items)}</p>
-        <p><a href="https://letmemugyou.com/admin/orders/{order.id}">View Order in Admin</a></p>
+        <h2>{len(notifications)} New Order{'s' if len(notifications) != 1 else ''} Received</h2>
+        <p><strong>Total:</strong> ${total:.2f}</p>
+        <table style="border-collapse: collapse;">
+            <thead>
+                <tr style="background: #f5f5f5;">
+                    <th style="padding: 6px; text-align: left;">Order</th>
+                    <th style="padding: 6px; text-align: left;">Customer</th>
+                    <th style="padding: 6px; text-align: left;">Items</th>
+                    <th style="padding: 6px; text-align: left;">Total</th>
+                </tr>
+            </thead>
+            <tbody>
+                {rows_html}
+            </tbody>
+        </table>
+        <p><a href="https://letmemugyou.com/admin/orders">View Orders in Admin</a></p>
     </body>
     </html>
     """
 
     return send_email(admin_email, subject, html_body)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=EMAIL_WORKERS, thread_name_prefix='email')
+    return _executor
+
+
+def _send_order_confirmation(app, order_id):
+    from models import Order
+
+    with app.app_context():
+        try:
+            order = Order.query.get(order_id)
+            if order is not None:
+                send_order_confirmation(order)
+        except Exception as e:
+            app.logger.error(f"Order email error for order {order_id}: {str(e)}")
+
+
+def _check_admin_digest(app, order_total):
+    from utils.notifications import check_admin_digest
+
+    with app.app_context():
+        try:
+            check_admin_digest(order_total)
+        except Exception as e:
+            app.logger.error(f"Admin digest error: {str(e)}")
+
+
+def send_order_emails_async(order):
+    """
+    Queue the customer confirmation, and flush or schedule the admin digest.
+
+    The order's digest row must already be committed (queue_admin_notification).
+    Separate jobs, so a slow customer send never holds up the admin digest.
+    """
+    app = current_app._get_current_object()
+    _get_executor().submit(_send_order_confirmation, app, order.id)
+    _get_executor().submit(_check_admin_digest, app, order.total)
+
+
+def _send_status_emails(app, order_ids, status):
+    from models import Order
+
+    with app.app_context():
+        # One query for the whole batch; a failed send doesn't stop the rest
+        for order in Order.query.filter(Order.id.in_(order_ids)).all():
+            try:
+                send_status_update(order, status)
+            except Exception as e:
+                app.logger.error(f"Status email error for order {order.id}: {str(e)}")
+
+
+def send_status_emails_async(order_ids, status):
+    """Queue status emails for a batch of orders as a single background job."""
+    app = current_app._get_current_object()
+    _get_executor().submit(_send_status_emails, app, list(order_ids), status)
@@ -0,0 +1,203 @@
+"""
+Streaming exports for Let Me Mug You.
+Everything here is a generator that yields bytes as it goes, so exports of
+any size run in constant memory and start downloading immediately.
+"""
+import io
+import os
+import csv
+import json
+import zipfile
+from datetime import datetime, timedelta
+from models import Order, OrderItem
+from utils.uploads import get_logo_path
+from utils.archive import order_sessions
+
+CHUNK_SIZE = 64 * 1024
+YIELD_PER = 500
+ROWS_PER_CHUNK = 200
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+# Columns exported for accounting; preview blobs are deliberately left out
+ORDER_EXPORT_COLUMNS = [
+    Order.id, Order.order_number, Order.order_date, Order.status, Order.payment_status,
+    Order.paypal_order_id, Order.customer_name, Order.email, Order.phone, Order.business_name,
+    Order.address_line1, Order.address_line2, Order.city, Order.state, Order.zip_code,
+    Order.subtotal, Order.tax, Order.total, Order.notes,
+]
+ITEM_EXPORT_COLUMNS = [
+    OrderItem.id, OrderItem.order_id, Order.order_number, Order.order_date, Order.status,
+    Order.payment_status, OrderItem.product_id, OrderItem.product_name, OrderItem.size,
+    OrderItem.quantity, OrderItem.unit_price, OrderItem.line_total, OrderItem.logo_filename,
+]
+
+
+def parse_date(value):
+    """Parse a YYYY-MM-DD filter value, returning None if blank or invalid."""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        return None
+
+
+def apply_order_filters(query, status=None, payment_status=None, start=None, end=None):
+    """Filter a query that includes Order by status, payment status and date range (end inclusive)."""
+    if status:
+        query = query.filter(Order.status == status)
+    if payment_status:
+        query = query.filter(Order.payment_status == payment_status)
+    start = parse_date(start)
+    if start:
+        query = query.filter(Order.order_date >= start)
+    end = parse_date(end)
+    if end:
+        query = query.filter(Order.order_date < end + timedelta(days=1))
+    return query
+
+
+class _ZipStream:
+    """Write-only file object that collects zip output until it's drained."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def artwork_rows(archived=True, **filters):
+    """Order item rows (without preview blobs) for the artwork export, archived months first."""
+    for session in order_sessions(archived, parse_date(filters.get('start')), parse_date(filters.get('end'))):
+        query = session.query(
+            OrderItem.id,
+            OrderItem.product_name,
+            OrderItem.size,
+            OrderItem.quantity,
+            OrderItem.logo_filename,
+            OrderItem.logo_position_data,
+            Order.order_number,
+            Order.order_date,
+            Order.status,
+        ).join(Order, OrderItem.order_id == Order.id)
+        query = apply_order_filters(query, **filters)
+        yield from query.order_by(Order.order_date, OrderItem.id).yield_per(YIELD_PER)
+
+
+def _artwork_name(row):
+    return f'{row.order_number}/{row.id}_{row.logo_filename}'
+
+
+def _zip_entry(name, compress_type):
+    info = zipfile.ZipInfo(name, date_time=datetime.utcnow().timetuple()[:6])
+    info.compress_type = compress_type
+    return info
+
+
+def stream_artwork_zip(**filters):
+    """
+    Yield a ZIP of engraving-ready artwork plus manifest.csv for matching order items.
+
+    The rows are read twice (manifest first, then files) so nothing but the
+    current row and file chunk is ever held in memory.
+    """
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w') as zf:
+        with zf.open(_zip_entry('manifest.csv', zipfile.ZIP_DEFLATED), 'w') as raw:
+            text = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+            writer = csv.writer(text)
+            writer.writerow(['order_number', 'order_date', 'status', 'order_item_id', 'product_name',
+                             'size', 'quantity', 'logo_filename', 'artwork_path', 'logo_position'])
+            for count, row in enumerate(artwork_rows(**filters), 1):
+                logo_path = get_logo_path(row.logo_filename)
+                has_file = bool(logo_path and os.path.isfile(logo_path))
+                writer.writerow([row.order_number, row.order_date.isoformat(), row.status, row.id,
+                                 row.product_name, row.size or '', row.quantity, row.logo_filename or '',
+                                 _artwork_name(row) if has_file else '', row.logo_position_data or ''])
+                if count % 100 == 0:
+                    text.flush()
+                    yield stream.drain()
+            text.flush()
+            text.detach()
+        yield stream.drain()
+
+        for row in artwork_rows(**filters):
+            logo_path = get_logo_path(row.logo_filename)
+            if not logo_path or not os.path.isfile(logo_path):
+                continue
+            # Artwork is PNG/SVG - PNG is already compressed, so store it as-is
+            compress_type = zipfile.ZIP_DEFLATED if logo_path.endswith('.svg') else zipfile.ZIP_STORED
+            with open(logo_path, 'rb') as src, zf.open(_zip_entry(_artwork_name(row), compress_type), 'w') as dst:
+                for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                    dst.write(chunk)
+                    yield stream.drain()
+            yield stream.drain()
+    yield stream.drain()
+
+
+def _column_label(column):
+    return 'item_id' if column is OrderItem.id else column.key
+
+
+def _export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _order_rows(columns, kind, archived, filters):
+    """Matching rows from each archive month (oldest first), then the live tables."""
+    for session in order_sessions(archived, parse_date(filters.get('start')), parse_date(filters.get('end'))):
+        query = session.query(*columns)
+        if kind == 'items':
+            query = query.join(Order, OrderItem.order_id == Order.id)
+            query = apply_order_filters(query, **filters).order_by(Order.order_date, OrderItem.id)
+        else:
+            query = apply_order_filters(query, **filters).order_by(Order.order_date, Order.id)
+        yield from query.yield_per(YIELD_PER)
+
+
+def stream_orders(fmt='csv', kind='orders', archived=True, **filters):
+    """
+    Yield orders (or order items, kind='items') as CSV or JSONL bytes.
+
+    Rows are fetched with yield_per and emitted every ROWS_PER_CHUNK rows,
+    so memory stays flat regardless of how many orders match. Archived
+    orders are included unless archived is False.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'Unknown export format: {fmt}')
+
+    columns = ITEM_EXPORT_COLUMNS if kind == 'items' else ORDER_EXPORT_COLUMNS
+    labels = [_column_label(column) for column in columns]
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+    if writer:
+        writer.writerow(labels)
+
+    for count, row in enumerate(_order_rows(columns, kind, archived, filters), 1):
+        values = [_export_value(value) for value in row]
+        if writer:
+            writer.writerow(values)
+        else:
+            buffer.write(json.dumps(dict(zip(labels, values))))
+            buffer.write('\n')
+
+        if count % ROWS_PER_CHUNK == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue().encode('utf-8')
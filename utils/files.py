@@ -0,0 +1,67 @@
+"""
+File serving for Let Me Mug You.
+In production Nginx sends the bytes: views return an empty response with an
+X-Accel-Redirect (or X-Sendfile) header after doing their access checks.
+Without a front-end server, files go out through send_file, which handles
+Range and conditional GETs and uses the server's sendfile wrapper.
+"""
+import os
+import mimetypes
+from urllib.parse import quote
+from flask import current_app, send_file, abort, Response
+
+# Roots files may be served from; each maps to an internal Nginx location
+# FILE_ACCEL_PREFIX/<root>/ (see README)
+FILE_ROOTS = {
+    'uploads': lambda app: os.path.join(app.root_path, 'static', 'uploads'),
+    'jobs': lambda app: os.path.join(app.instance_path, 'jobs'),
+    'profiles': lambda app: os.path.join(app.instance_path, 'profiles'),
+}
+SENDERS = ('x-accel', 'x-sendfile')
+
+
+def _relative_path(root, path):
+    """path relative to the named root, or None if it's outside it."""
+    root_dir = os.path.realpath(FILE_ROOTS[root](current_app))
+    path = os.path.realpath(path)
+    if os.path.commonpath([root_dir, path]) != root_dir:
+        return None
+    return os.path.relpath(path, root_dir)
+
+
+def send_protected(root, path, mimetype=None, as_attachment=False, download_name=None, max_age=0):
+    """
+    Send the file at path (which must be inside FILE_ROOTS[root]).
+
+    Access checks belong in the view; this only decides who copies the bytes.
+    """
+    relative = _relative_path(root, path) if path else None
+    if relative is None or not os.path.isfile(path):
+        abort(404)
+
+    sender = current_app.config.get('FILE_SENDER')
+    if sender not in SENDERS:
+        return send_file(path, mimetype=mimetype, as_attachment=as_attachment,
+                         download_name=download_name, max_age=max_age, conditional=True)
+
+    # Build headers the same way send_file would, then hand the body to the front end
+    response = Response(mimetype=mimetype or mimetypes.guess_type(path)[0] or 'application/octet-stream')
+    if as_attachment:
+        name = download_name or os.path.basename(path)
+        if name.isascii():
+            response.headers.set('Content-Disposition', 'attachment', filename=name)
+        else:
+            response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(name)}"
+    if max_age:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+    else:
+        response.cache_control.no_cache = True
+
+    if sender == 'x-accel':
+        prefix = current_app.config.get('FILE_ACCEL_PREFIX', '/_protected').rstrip('/')
+        response.headers['X-Accel-Redirect'] = quote(f'{prefix}/{root}/{relative}')
+    else:
+        response.headers['X-Sendfile'] = os.path.realpath(path)
+    return response
+
@@ -0,0 +1,84 @@
+"""
+Border-connected region detection for background removal.
+The mask is split into horizontal runs, runs in neighbouring rows that
+overlap are linked, and a search from the runs touching the image border
+finds the background. Everything is linear in pixels + runs.
+"""
+import numpy as np
+
+
+def mask_runs(mask):
+    """
+    Horizontal runs of True pixels, in row-major order.
+
+    Returns (rows, starts, ends) int arrays; ends are exclusive.
+    """
+    height, width = mask.shape
+    rows, starts, ends = [], [], []
+    padded = np.zeros((min(height, 256), width + 2), dtype=np.int8)
+    for top in range(0, height, 256):
+        strip = mask[top:top + 256]
+        edges = padded[:strip.shape[0]]
+        edges[:, 1:-1] = strip
+        change = np.diff(edges, axis=1)
+        start_rows, start_cols = np.nonzero(change == 1)
+        _, end_cols = np.nonzero(change == -1)
+        rows.append(start_rows + top)
+        starts.append(start_cols)
+        ends.append(end_cols)
+    return np.concatenate(rows), np.concatenate(starts), np.concatenate(ends)
+
+
+def _overlap_pairs(rows, starts, ends, width):
+    """Index pairs (upper, lower) of runs in adjacent rows that share at least one column."""
+    stride = width + 1
+    start_keys = rows * stride + starts
+    end_keys = rows * stride + ends
+
+    # For each run, the overlapping runs in the row above form a contiguous range
+    above = (rows - 1) * stride
+    first = np.searchsorted(end_keys, above + starts, side='right')
+    last = np.searchsorted(start_keys, above + ends, side='left')
+    counts = np.where(rows > 0, np.maximum(last - first, 0), 0)
+
+    total = int(counts.sum())
+    lower = np.repeat(np.arange(len(rows)), counts)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    upper = np.repeat(first, counts) + offsets
+    return upper, lower
+
+
+def border_connected_runs(mask):
+    """
+    Runs of the mask that are 4-connected to the image border.
+
+    Returns (rows, starts, ends) for just those runs.
+    """
+    height, width = mask.shape
+    rows, starts, ends = mask_runs(mask)
+    if len(rows) == 0:
+        return rows, starts, ends
+
+    upper, lower = _overlap_pairs(rows, starts, ends, width)
+
+    # Undirected adjacency in CSR form
+    sources = np.concatenate([upper, lower])
+    targets = np.concatenate([lower, upper])
+    order = np.argsort(sources, kind='stable')
+    indices = targets[order].tolist()
+    indptr = np.searchsorted(sources[order], np.arange(len(rows) + 1)).tolist()
+
+    seeds = np.nonzero((rows == 0) | (rows == height - 1) | (starts == 0) | (ends == width))[0]
+    reached = bytearray(len(rows))
+    stack = seeds.tolist()
+    for run in stack:
+        reached[run] = 1
+    while stack:
+        run = stack.pop()
+        for neighbour in indices[indptr[run]:indptr[run + 1]]:
+            if not reached[neighbour]:
+                reached[neighbour] = 1
+                stack.append(neighbour)
+
+    selected = np.frombuffer(bytes(reached), dtype=np.uint8).astype(bool)
+    return rows[selected], starts[selected], ends[selected]
@@ -0,0 +1,229 @@
+"""
+Laser bed gang-sheet packer for Let Me Mug You.
+Packs the engraving artwork of pending order items onto a laser bed so a
+whole batch can be engraved as one job.
+"""
+import os
+import json
+import uuid
+from datetime import datetime
+from PIL import Image
+from flask import current_app
+from models import Order, OrderItem, Product
+from utils.uploads import get_logo_path
+
+# Physical size of one configurator canvas pixel, per category. Products are
+# fit to the 360px-high canvas area, so this is roughly product height / 360.
+MM_PER_CANVAS_PX = {
+    'mug': 0.5,
+    'glass': 0.42,
+    'coaster': 0.28,
+    'keychain': 0.14,
+}
+DEFAULT_MM_PER_CANVAS_PX = 0.3
+
+MM_PER_INCH = 25.4
+
+
+def pack_rectangles(sizes, bed_width, bed_height, gap=0):
+    """
+    Pack rectangles onto as few beds as possible (first-fit decreasing height shelves).
+
+    sizes is a list of (width, height). Rectangles may be rotated 90 degrees.
+    Returns (placements, unplaced) where placements is a list of dicts with
+    index, sheet, x, y, width, height, rotated and unplaced is a list of indexes
+    that can't fit on an empty bed.
+    """
+    items = []
+    unplaced = []
+    for index, (width, height) in enumerate(sizes):
+        # Lay items flat (short side up) so shelves stay low, unless that won't fit
+        rotated = height > width
+        if rotated:
+            width, height = height, width
+        if width > bed_width or height > bed_height:
+            if height <= bed_width and width <= bed_height:
+                width, height, rotated = height, width, not rotated
+            else:
+                unplaced.append(index)
+                continue
+        items.append((height, width, index, rotated))
+
+    items.sort(key=lambda item: (-item[0], -item[1]))
+
+    # Each shelf is [sheet, y, height, next_x]; sheet_heights tracks used height per bed
+    shelves = []
+    sheet_heights = []
+    placements = []
+    for height, width, index, rotated in items:
+        shelf = None
+        for candidate in shelves:
+            if candidate[3] + width <= bed_width and height <= candidate[2]:
+                shelf = candidate
+                break
+
+        if shelf is None:
+            for sheet, used in enumerate(sheet_heights):
+                y = used + gap if used else 0
+                if y + height <= bed_height:
+                    break
+            else:
+                sheet, y = len(sheet_heights), 0
+                sheet_heights.append(0)
+            shelf = [sheet, y, height, 0]
+            shelves.append(shelf)
+            sheet_heights[sheet] = y + height
+
+        placements.append({
+            'index': index,
+            'sheet': shelf[0],
+            'x': shelf[3],
+            'y': shelf[1],
+            'width': width,
+            'height': height,
+            'rotated': rotated,
+        })
+        shelf[3] += width + gap
+
+    placements.sort(key=lambda p: p['index'])
+    return placements, unplaced
+
+
+def get_jobs_folder():
+    """Folder where generated engraving jobs are kept (not publicly served)."""
+    folder = os.path.join(current_app.instance_path, 'jobs')
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def get_pending_items(category):
+    """Order items in processing orders for a product category."""
+    return (OrderItem.query
+            .join(Order, OrderItem.order_id == Order.id)
+            .join(Product, OrderItem.product_id == Product.id)
+            .filter(Order.status == 'processing', Product.category == category)
+            .order_by(Order.order_date, OrderItem.id)
+            .all())
+
+
+def load_artwork(logo_path, position):
+    """Processed logo as an engraving mask ('L', black = burn) with the customer's rotation applied."""
+    with Image.open(logo_path) as img:
+        img = img.convert('RGBA')
+    white = Image.new('RGBA', img.size, (255, 255, 255, 255))
+    white.alpha_composite(img)
+    art = white.convert('L')
+
+    angle = float(position.get('angle') or 0)
+    if angle:
+        art = art.rotate(-angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+    return art
+
+
+def artwork_size_mm(art, position, category):
+    """Physical engraving size of the artwork as placed in the configurator."""
+    mm_per_px = MM_PER_CANVAS_PX.get(category, DEFAULT_MM_PER_CANVAS_PX)
+    scale_x = abs(float(position.get('scaleX') or 1))
+    scale_y = abs(float(position.get('scaleY') or 1))
+    return art.width * scale_x * mm_per_px, art.height * scale_y * mm_per_px
+
+
+def build_gang_sheets(category, bed_width_mm, bed_height_mm, dpi=300, gap_mm=3):
+    """
+    Pack all processing items of a category onto laser beds.
+
+    Writes one PNG per bed plus manifest.json into a new job folder and
+    returns the manifest dict.
+    """
+    px_per_mm = dpi / MM_PER_INCH
+    bed_px = (round(bed_width_mm * px_per_mm), round(bed_height_mm * px_per_mm))
+    gap_px = round(gap_mm * px_per_mm)
+
+    # One artwork per item, one rectangle per physical unit (quantity)
+    artworks = {}
+    units = []
+    sizes = []
+    skipped = []
+    for item in get_pending_items(category):
+        logo_path = get_logo_path(item.logo_filename)
+        if not logo_path or not os.path.isfile(logo_path) or logo_path.lower().endswith('.svg'):
+            skipped.append({'order_item_id': item.id, 'reason': 'no raster artwork'})
+            continue
+
+        position = item.get_position_data()
+        art = load_artwork(logo_path, position)
+        width_mm, height_mm = artwork_size_mm(art, position, category)
+        size_px = (max(1, round(width_mm * px_per_mm)), max(1, round(height_mm * px_per_mm)))
+        artworks[item.id] = art.resize(size_px, Image.LANCZOS)
+
+        for unit in range(item.quantity or 1):
+            units.append((item, unit))
+            sizes.append(size_px)
+
+    placements, unplaced = pack_rectangles(sizes, bed_px[0], bed_px[1], gap_px)
+    for index in unplaced:
+        skipped.append({'order_item_id': units[index][0].id, 'reason': 'larger than laser bed'})
+
+    job_id = f"{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}-{category}-{uuid.uuid4().hex[:6]}"
+    job_folder = os.path.join(get_jobs_folder(), job_id)
+    os.makedirs(job_folder)
+
+    sheet_count = max((p['sheet'] for p in placements), default=-1) + 1
+    by_sheet = [[] for _ in range(sheet_count)]
+    manifest_placements = []
+    for placement in placements:
+        item, unit = units[placement['index']]
+        by_sheet[placement['sheet']].append(placement)
+        manifest_placements.append({
+            'sheet': placement['sheet'],
+            'order_number': item.order.order_number,
+            'order_item_id': item.id,
+            'unit': unit + 1,
+            'product_name': item.product_name,
+            'logo_filename': item.logo_filename,
+            'x_mm': round(placement['x'] / px_per_mm, 2),
+            'y_mm': round(placement['y'] / px_per_mm, 2),
+            'width_mm': round(placement['width'] / px_per_mm, 2),
+            'height_mm': round(placement['height'] / px_per_mm, 2),
+            'rotated': placement['rotated'],
+        })
+
+    # A full bed is tens of MB at engraving resolution, so only one is held at a time
+    sheet_files = []
+    for number, sheet_placements in enumerate(by_sheet):
+        with Image.new('L', bed_px, 255) as sheet:
+            for placement in sheet_placements:
+                art = artworks[units[placement['index']][0].id]
+                if placement['rotated']:
+                    art = art.transpose(Image.ROTATE_90)
+                sheet.paste(art, (placement['x'], placement['y']))
+            filename = f'sheet-{number + 1}.png'
+            sheet.save(os.path.join(job_folder, filename), 'PNG', dpi=(dpi, dpi), optimize=True)
+        sheet_files.append(filename)
+
+    manifest = {
+        'job_id': job_id,
+        'category': category,
+        'created_at': datetime.utcnow().isoformat(),
+        'bed_mm': [bed_width_mm, bed_height_mm],
+        'dpi': dpi,
+        'gap_mm': gap_mm,
+        'sheets': sheet_files,
+        'placements': manifest_placements,
+        'skipped': skipped,
+    }
+    with open(os.path.join(job_folder, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def list_jobs():
+    """Existing job manifests, newest first."""
+    folder = get_jobs_folder()
+    jobs = []
+    for job_id in sorted(os.listdir(folder), reverse=True):
+        manifest_path = os.path.join(folder, job_id, 'manifest.json')
+        if os.path.isfile(manifest_path):
+            with open(manifest_path) as f:
+                jobs.append(json.load(f))
+    return jobs
@@ -0,0 +1,150 @@
+"""
+Admin new-order notifications for Let Me Mug You.
+New orders are buffered in the admin_notifications table and sent as one
+digest email per window (ADMIN_DIGEST_WINDOW seconds) or once
+ADMIN_DIGEST_MAX_ORDERS are waiting, whichever comes first. An order worth
+ADMIN_DIGEST_URGENT_TOTAL or more flushes right away. The table is durable,
+and its row is written in the same commit as the order, so a worker
+restart only delays a digest until the next order or `flask send-admin-digest`.
+"""
+import uuid
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import update, delete, func
+from models import AdminNotification, db
+
+DEFAULT_WINDOW = 300  # Seconds
+DEFAULT_MAX_ORDERS = 50
+DEFAULT_URGENT_TOTAL = 500.0
+CLAIM_TIMEOUT = 600  # Seconds before a digest claimed by a crashed worker is retried
+RETRY_DELAY = 30  # Minimum seconds between timer checks, so a failing SMTP server isn't hammered
+KEEP_SENT_DAYS = 30
+
+_timer = None
+_timer_lock = threading.Lock()
+
+
+def _settings(app):
+    return (app.config.get('ADMIN_DIGEST_WINDOW', DEFAULT_WINDOW),
+            app.config.get('ADMIN_DIGEST_MAX_ORDERS', DEFAULT_MAX_ORDERS),
+            app.config.get('ADMIN_DIGEST_URGENT_TOTAL', DEFAULT_URGENT_TOTAL))
+
+
+def queue_admin_notification(order, item_count):
+    """Buffer a new-order event in the current transaction; the caller commits it with the order."""
+    db.session.add(AdminNotification(
+        order_id=order.id,
+        order_number=order.order_number,
+        customer_name=order.customer_name,
+        email=order.email,
+        business_name=order.business_name,
+        total=order.total or 0,
+        item_count=item_count,
+    ))
+
+
+def check_admin_digest(order_total):
+    """After a new order is committed: flush the digest now if it's full or the order is urgent, else schedule it."""
+    app = current_app._get_current_object()
+    window, max_orders, urgent_total = _settings(app)
+    if window <= 0 or (order_total or 0) >= urgent_total:
+        return flush_admin_digest()
+    pending, oldest = pending_summary()
+    if pending >= max_orders or (oldest and oldest <= datetime.utcnow() - timedelta(seconds=window)):
+        return flush_admin_digest()
+    _schedule_flush(app, _seconds_until_due(oldest, window))
+    return 0
+
+
+def _seconds_until_due(oldest, window):
+    if oldest is None:
+        return window
+    return max(RETRY_DELAY, window - (datetime.utcnow() - oldest).total_seconds())
+
+
+def pending_summary():
+    """(number of unclaimed notifications, creation time of the oldest)."""
+    return db.session.query(func.count(AdminNotification.id), func.min(AdminNotification.created_at)).filter(
+        AdminNotification.batch.is_(None)).one()
+
+
+def flush_admin_digest(force=True):
+    """
+    Send everything pending as one digest. Returns the number of orders sent.
+
+    Rows are claimed with one UPDATE first, so two workers flushing at once
+    never send the same order twice. With force=False, only flush if the
+    oldest pending order has waited a full window.
+    """
+    from utils.email import send_admin_digest
+
+    now = datetime.utcnow()
+    window, _, _ = _settings(current_app)
+
+    # Release digests claimed by a worker that died before sending
+    db.session.execute(update(AdminNotification)
+                       .where(AdminNotification.sent_at.is_(None),
+                              AdminNotification.batch < _batch_token(now - timedelta(seconds=CLAIM_TIMEOUT)))
+                       .values(batch=None))
+    if not force:
+        _, oldest = pending_summary()
+        if not oldest or oldest > now - timedelta(seconds=window):
+            db.session.commit()
+            return 0
+
+    batch = _batch_token(now)
+    db.session.execute(update(AdminNotification).where(AdminNotification.batch.is_(None)).values(batch=batch))
+    db.session.commit()
+
+    entries = AdminNotification.query.filter_by(batch=batch).order_by(AdminNotification.id).all()
+    if not entries:
+        return 0
+    try:
+        sent = send_admin_digest(entries)
+    except Exception as e:
+        current_app.logger.error(f'Admin digest error: {str(e)}')
+        sent = False
+
+    if sent:
+        db.session.execute(update(AdminNotification).where(AdminNotification.batch == batch).values(sent_at=now))
+        db.session.execute(delete(AdminNotification).where(
+            AdminNotification.sent_at < now - timedelta(days=KEEP_SENT_DAYS)))
+    else:
+        # Put them back for the next flush
+        db.session.execute(update(AdminNotification).where(AdminNotification.batch == batch).values(batch=None))
+    db.session.commit()
+    return len(entries) if sent else 0
+
+
+def _batch_token(when):
+    """Batch ids sort by claim time, so stale claims can be found with a comparison."""
+    return f"{when.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:12]}"
+
+
+def _run_timer(app):
+    global _timer
+    with _timer_lock:
+        _timer = None
+    with app.app_context():
+        try:
+            flush_admin_digest(force=False)
+            pending, oldest = pending_summary()
+        except Exception as e:
+            app.logger.error(f'Admin digest timer error: {str(e)}')
+            return
+        finally:
+            db.session.remove()
+    if pending:
+        _schedule_flush(app, _seconds_until_due(oldest, _settings(app)[0]))
+
+
+def _schedule_flush(app, delay):
+    """Make sure this worker checks for a due digest after delay seconds."""
+    global _timer
+    with _timer_lock:
+        if _timer is not None:
+            return
+        _timer = threading.Timer(delay, _run_timer, args=(app,))
+        _timer.daemon = True
+        _timer.start()
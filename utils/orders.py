@@ -0,0 +1,93 @@
+"""
+Order status transitions for Let Me Mug You.
+Status changes for any number of orders are validated up front and applied
+with one UPDATE in one transaction, so a shipping run of hundreds of orders
+costs a single commit. Customer emails for the changes go out as one batch.
+"""
+from datetime import datetime
+from sqlalchemy import update
+from models import Order, db
+from utils.email import send_status_emails_async
+
+ORDER_STATUSES = ['pending', 'processing', 'completed', 'shipped']
+
+# Bulk moves go forward any number of steps, or back one step to correct a
+# mistake; a single order can still be set to any status from its page
+ALLOWED_TRANSITIONS = {
+    status: {target for target_index, target in enumerate(ORDER_STATUSES)
+             if target_index > index or target_index == index - 1}
+    for index, status in enumerate(ORDER_STATUSES)
+}
+
+# Statuses customers are emailed about
+NOTIFY_STATUSES = {'shipped'}
+
+
+def transition_orders(order_ids, new_status, notify=True, enforce_transitions=True):
+    """
+    Move orders to new_status in one transaction.
+
+    With enforce_transitions, moves outside ALLOWED_TRANSITIONS are
+    reported as 'invalid' instead of applied.
+
+    Returns a list of per-order result dicts (id, order_number, from, to,
+    result, message) in the order the ids were given. result is one of
+    'updated', 'unchanged', 'invalid', 'not_found' or 'conflict' (changed by
+    someone else mid-request).
+    """
+    if new_status not in ORDER_STATUSES:
+        raise ValueError(f'Unknown status "{new_status}"')
+
+    order_ids = list(dict.fromkeys(order_ids))
+    current = {row.id: row for row in db.session.query(Order.id, Order.order_number, Order.status)
+               .filter(Order.id.in_(order_ids))}
+
+    results = []
+    by_status = {}
+    for order_id in order_ids:
+        row = current.get(order_id)
+        if row is None:
+            results.append({'id': order_id, 'order_number': None, 'from': None, 'to': new_status,
+                            'result': 'not_found', 'message': 'Order not found'})
+            continue
+        result = {'id': order_id, 'order_number': row.order_number, 'from': row.status, 'to': new_status}
+        if row.status == new_status:
+            result.update(result='unchanged', message=f'Already {new_status}')
+        elif enforce_transitions and new_status not in ALLOWED_TRANSITIONS.get(row.status, ()):
+            result.update(result='invalid', message=f'Cannot move from {row.status} to {new_status}')
+        else:
+            result.update(result='updated', message='')
+            by_status.setdefault(row.status, []).append(order_id)
+        results.append(result)
+
+    if not by_status:
+        return results
+
+    # The status guard skips orders changed since they were read; RETURNING says which were updated
+    allowed_from = list(by_status)
+    candidates = [order_id for ids in by_status.values() for order_id in ids]
+    updated = set(db.session.execute(
+        update(Order)
+        .where(Order.id.in_(candidates), Order.status.in_(allowed_from))
+        # shipped_at drives archiving (utils/archive.py); moving back off shipped clears it
+        .values(status=new_status, shipped_at=datetime.utcnow() if new_status == 'shipped' else None)
+        .returning(Order.id)
+        .execution_options(synchronize_session=False)
+    ).scalars())
+    db.session.commit()
+
+    for result in results:
+        if result['result'] == 'updated' and result['id'] not in updated:
+            result.update(result='conflict', message='Changed by someone else, try again')
+
+    if notify and new_status in NOTIFY_STATUSES and updated:
+        send_status_emails_async(sorted(updated), new_status)
+    return results
+
+
+def summarize_results(results):
+    """Count of results per outcome."""
+    counts = {}
+    for result in results:
+        counts[result['result']] = counts.get(result['result'], 0) + 1
+    return counts
@@ -0,0 +1,129 @@
+"""
+PayPal REST client for Let Me Mug You.
+Uses one pooled HTTP session per worker and caches the OAuth token, so a
+checkout costs a single PayPal round trip instead of two fresh TLS
+handshakes plus a token request.
+"""
+import os
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from models import AdminSettings
+
+API_BASES = {
+    'live': 'https://api-m.paypal.com',
+    'sandbox': 'https://api-m.sandbox.paypal.com',
+}
+TIMEOUT = (5, 30)  # connect, read (seconds)
+POOL_SIZE = 20  # Connections kept per host; matters under gevent workers
+TOKEN_EXPIRY_MARGIN = 60  # Refresh tokens this many seconds early
+
+_session = None
+_session_lock = threading.Lock()
+_token_cache = {}
+_token_lock = threading.Lock()
+
+
+def get_session():
+    """Shared requests session with a keep-alive connection pool."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def get_paypal_config():
+    """Return (mode, api_base, client_id, secret) for the current PayPal mode."""
+    paypal_mode = AdminSettings.get('paypal_mode', os.getenv('PAYPAL_MODE', 'sandbox'))
+
+    if paypal_mode == 'live':
+        client_id = os.getenv('PAYPAL_LIVE_CLIENT_ID')
+        secret = os.getenv('PAYPAL_LIVE_SECRET')
+    else:
+        paypal_mode = 'sandbox'
+        client_id = os.getenv('PAYPAL_SANDBOX_CLIENT_ID')
+        secret = os.getenv('PAYPAL_SANDBOX_SECRET')
+
+    # PAYPAL_API_BASE points at a stub server for load testing
+    api_base = os.getenv('PAYPAL_API_BASE') or API_BASES[paypal_mode]
+    return paypal_mode, api_base, client_id, secret
+
+
+def get_paypal_access_token():
+    """Get a PayPal access token, reusing the cached one until shortly before it expires."""
+    paypal_mode, api_base, client_id, secret = get_paypal_config()
+    cache_key = (api_base, client_id)
+
+    cached = _token_cache.get(cache_key)
+    if cached and cached[1] > time.time():
+        return cached[0], api_base
+
+    with _token_lock:
+        cached = _token_cache.get(cache_key)
+        if cached and cached[1] > time.time():
+            return cached[0], api_base
+
+        response = get_session().post(
+            f'{api_base}/v1/oauth2/token',
+            headers={'Accept': 'application/json'},
+            data={'grant_type': 'client_credentials'},
+            auth=(client_id, secret),
+            timeout=TIMEOUT
+        )
+        response.raise_for_status()
+        data = response.json()
+        expires_at = time.time() + int(data.get('expires_in', 0)) - TOKEN_EXPIRY_MARGIN
+        _token_cache[cache_key] = (data['access_token'], expires_at)
+        return data['access_token'], api_base
+
+
+def _post(path, payload=None):
+    access_token, api_base = get_paypal_access_token()
+    response = get_session().post(
+        f'{api_base}{path}',
+        headers={
+            'Content-Type': 'application/json',
+            'Authorization': f'Bearer {access_token}'
+        },
+        json=payload,
+        timeout=TIMEOUT
+    )
+    if response.status_code == 401:
+        # Token revoked early - drop it so the next call fetches a fresh one
+        _token_cache.clear()
+    response.raise_for_status()
+    return response.json()
+
+
+def create_order(totals):
+    """Create a PayPal order for the cart totals. Returns the PayPal order id."""
+    payload = {
+        'intent': 'CAPTURE',
+        'purchase_units': [{
+            'amount': {
+                'currency_code': 'USD',
+                'value': f"{totals['total']:.2f}",
+                'breakdown': {
+                    'item_total': {'currency_code': 'USD', 'value': f"{totals['subtotal']:.2f}"},
+                    'tax_total': {'currency_code': 'USD', 'value': f"{totals['tax']:.2f}"}
+                }
+            }
+        }],
+        'application_context': {
+            'brand_name': 'Let Me Mug You',
+            'user_action': 'PAY_NOW'
+        }
+    }
+    return _post('/v2/checkout/orders', payload)['id']
+
+
+def capture_order(paypal_order_id):
+    """Capture an approved PayPal order. Returns PayPal's capture response."""
+    return _post(f'/v2/checkout/orders/{paypal_order_id}/capture')
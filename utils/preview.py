@@ -0,0 +1,237 @@
+"""
+Server-side preview compositor for Let Me Mug You.
+Rebuilds the configurator preview from the product image, the processed
+logo and the Fabric.js transform, instead of trusting a client-rendered PNG.
+"""
+import os
+import json
+import hashlib
+from functools import lru_cache
+from PIL import Image
+from flask import current_app
+from markupsafe import Markup
+
+try:
+    import cairosvg  # Needed to rasterize SVG products and logos (needs the system Cairo library)
+except (ImportError, OSError):
+    cairosvg = None
+
+# Must match the <canvas> in templates/configurator.html
+PREVIEW_CANVAS_SIZE = (500, 400)
+PREVIEW_BACKGROUND = (245, 245, 245, 255)  # #f5f5f5
+PREVIEW_PADDING = 20  # configurator.js fits the product into canvas - 40px
+
+# Thumbnail widths that may be requested; anything else is rejected
+THUMBNAIL_SIZES = (80, 120, 240)
+
+TRANSFORM_KEYS = ('left', 'top', 'scaleX', 'scaleY', 'angle')
+TRANSFORM_DEFAULTS = {'left': PREVIEW_CANVAS_SIZE[0] / 2, 'top': PREVIEW_CANVAS_SIZE[1] / 2,
+                      'scaleX': 1.0, 'scaleY': 1.0, 'angle': 0.0}
+
+
+def preview_img(url, width):
+    """
+    src/srcset/sizes attributes for a preview shown width CSS pixels wide.
+
+    Server-rendered previews point at their thumbnails so lists don't
+    download full renders; data URLs and other images are used as they are.
+    """
+    from utils.uploads import PREVIEW_URL_PREFIX  # Imports models
+    if not url.startswith(PREVIEW_URL_PREFIX):
+        return Markup('src="{}"').format(url)
+    fallback = next((size for size in THUMBNAIL_SIZES if size >= width), THUMBNAIL_SIZES[-1])
+    srcset = ', '.join(f'{url}?size={size} {size}w' for size in THUMBNAIL_SIZES)
+    return Markup('src="{}?size={}" srcset="{}" sizes="{}px"').format(url, fallback, srcset, width)
+
+
+def init_previews(app):
+    """Warn at startup if SVGs can't be rasterized, and expose the preview helpers to templates."""
+    if cairosvg is None:
+        app.logger.warning('cairosvg is not available: previews with SVG products or logos '
+                           'fall back to the browser-rendered PNG')
+    app.jinja_env.globals.update(server_svg_previews=cairosvg is not None, preview_img=preview_img)
+
+
+def get_preview_folder():
+    """Folder where rendered previews and thumbnails are cached."""
+    folder = os.path.join(current_app.root_path, 'static', 'uploads', 'previews')
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def normalize_transform(position):
+    """Coerce a logo_position dict to floats, rounded so equal layouts share a cache entry."""
+    position = position or {}
+    transform = {}
+    for key in TRANSFORM_KEYS:
+        try:
+            value = float(position.get(key, TRANSFORM_DEFAULTS[key]))
+        except (TypeError, ValueError):
+            value = TRANSFORM_DEFAULTS[key]
+        transform[key] = round(value, 2)
+    return transform
+
+
+@lru_cache(maxsize=256)
+def _file_digest(path, mtime):
+    """SHA-1 of a file's contents (keyed on mtime so edits invalidate it)."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_digest(path):
+    return _file_digest(path, os.path.getmtime(path))
+
+
+def preview_cache_key(product_id, image_url, logo_digest, transform):
+    """Cache key for a (product, logo hash, transform) combination."""
+    raw = json.dumps([product_id, image_url, logo_digest, transform], sort_keys=True)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def load_image(path, size=None):
+    """Open a raster image, or rasterize an SVG if cairosvg is installed."""
+    if path.lower().endswith('.svg'):
+        if cairosvg is None:
+            return None
+        from io import BytesIO
+        kwargs = {}
+        if size:
+            kwargs = {'output_width': size[0], 'output_height': size[1]}
+        png = cairosvg.svg2png(url=path, **kwargs)
+        return Image.open(BytesIO(png)).convert('RGBA')
+    img = Image.open(path)
+    img.load()
+    return img.convert('RGBA')
+
+
+@lru_cache(maxsize=32)
+def _product_layer(path, mtime):
+    """Product image scaled and centered the same way configurator.js does it, or None if it can't be loaded."""
+    img = load_image(path)
+    if img is None:
+        return None
+    canvas = Image.new('RGBA', PREVIEW_CANVAS_SIZE, PREVIEW_BACKGROUND)
+
+    max_w = PREVIEW_CANVAS_SIZE[0] - 2 * PREVIEW_PADDING
+    max_h = PREVIEW_CANVAS_SIZE[1] - 2 * PREVIEW_PADDING
+    scale = min(max_w / img.width, max_h / img.height)
+    target = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+
+    # Re-rasterize SVGs at the target size rather than upscaling a small bitmap
+    if path.lower().endswith('.svg'):
+        img = load_image(path, target)
+    else:
+        img = img.resize(target, Image.LANCZOS)
+
+    x = (PREVIEW_CANVAS_SIZE[0] - img.width) // 2
+    y = (PREVIEW_CANVAS_SIZE[1] - img.height) // 2
+    canvas.alpha_composite(img, dest=(x, y))
+    return canvas
+
+
+def _product_image_path(product):
+    return product_image_path(current_app.root_path, product.image_url)
+
+
+def product_image_path(root_path, image_url):
+    """Local file behind a /static product image URL, or None."""
+    if not image_url or not image_url.startswith('/static/'):
+        return None
+    path = os.path.join(root_path, image_url.lstrip('/'))
+    return path if os.path.isfile(path) else None
+
+
+def composite_preview(product_path, logo_path, transform):
+    """Draw the logo over the product layer using a Fabric.js center-origin transform."""
+    if product_path:
+        product_layer = _product_layer(product_path, os.path.getmtime(product_path))
+        if product_layer is None:
+            return None  # A blank canvas would pass for a real preview
+        canvas = product_layer.copy()
+    else:
+        canvas = Image.new('RGBA', PREVIEW_CANVAS_SIZE, PREVIEW_BACKGROUND)
+
+    logo = load_image(logo_path)
+    if logo is None:
+        return None
+
+    width = max(1, round(logo.width * abs(transform['scaleX'])))
+    height = max(1, round(logo.height * abs(transform['scaleY'])))
+    logo = logo.resize((width, height), Image.LANCZOS)
+    if transform['scaleX'] < 0:
+        logo = logo.transpose(Image.FLIP_LEFT_RIGHT)
+    if transform['scaleY'] < 0:
+        logo = logo.transpose(Image.FLIP_TOP_BOTTOM)
+
+    # Fabric angles are clockwise degrees, Pillow rotates counter-clockwise
+    if transform['angle']:
+        logo = logo.rotate(-transform['angle'], resample=Image.BICUBIC, expand=True)
+
+    # alpha_composite needs a non-negative destination, so place the logo on
+    # a full-size transparent layer first (handles logos dragged off-canvas)
+    layer = Image.new('RGBA', PREVIEW_CANVAS_SIZE, (0, 0, 0, 0))
+    x = round(transform['left'] - logo.width / 2)
+    y = round(transform['top'] - logo.height / 2)
+    layer.paste(logo, (x, y), logo)
+    canvas.alpha_composite(layer)
+    return canvas.convert('RGB')
+
+
+def render_preview(product, logo_path, position):
+    """
+    Render (or reuse) the preview for a product/logo/transform.
+
+    Returns the cache key, or None if the preview can't be rendered here
+    (an SVG product or logo without cairosvg installed).
+    """
+    return render_preview_file(get_preview_folder(), product.id, product.image_url,
+                               _product_image_path(product), logo_path, position)
+
+
+def render_preview_file(folder, product_id, image_url, product_path, logo_path, position, optimize=True):
+    """render_preview without an app context, for worker processes."""
+    if not logo_path or not os.path.isfile(logo_path):
+        return None
+
+    transform = normalize_transform(position)
+    key = preview_cache_key(product_id, image_url, file_digest(logo_path), transform)
+    output_path = os.path.join(folder, f'{key}.png')
+    if os.path.exists(output_path):
+        return key
+
+    image = composite_preview(product_path, logo_path, transform)
+    if image is None:
+        return None
+
+    # Write to a temp name and rename so concurrent workers never see a partial file
+    tmp_path = f'{output_path}.{os.getpid()}.tmp'
+    image.save(tmp_path, 'PNG', optimize=optimize)
+    os.replace(tmp_path, output_path)
+    return key
+
+
+def get_preview_path(key, size=None):
+    """
+    Path to a cached preview, producing the thumbnail on demand.
+
+    Returns None if the preview hasn't been rendered.
+    """
+    folder = get_preview_folder()
+    full_path = os.path.join(folder, f'{key}.png')
+    if not os.path.exists(full_path):
+        return None
+    if not size:
+        return full_path
+
+    thumb_path = os.path.join(folder, f'{key}_{size}.png')
+    if not os.path.exists(thumb_path):
+        with Image.open(full_path) as img:
+            img.thumbnail((size, size), Image.LANCZOS)
+            tmp_path = f'{thumb_path}.{os.getpid()}.tmp'
+            img.save(tmp_path, 'PNG', optimize=True)
+        os.replace(tmp_path, thumb_path)
+    return thumb_path
@@ -0,0 +1,220 @@
+"""
+Pricing engine for Let Me Mug You.
+All arithmetic is in integer cents. Each product's base price and quantity
+tiers are compiled into a dense unit-price table, so pricing a line is a
+list lookup. The table is rebuilt whenever a product or its tiers change.
+"""
+import os
+import threading
+from decimal import Decimal, ROUND_HALF_UP
+from flask import current_app
+from models import Product, PriceTier, AdminSettings, db
+
+DEFAULT_TAX_RATE = '0.0825'  # 8.25%
+
+_table = None
+_table_lock = threading.Lock()
+
+
+def to_cents(value):
+    """Dollars (float, str or Decimal) to integer cents, rounding half up."""
+    return int((Decimal(str(value)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def to_dollars(cents):
+    return cents / 100
+
+
+def parse_tiers(text):
+    """
+    Parse "min_quantity: price" pairs (one per line or comma-separated).
+
+    Returns a sorted list of (min_quantity, unit_price_cents). Raises ValueError.
+    """
+    tiers = {}
+    for part in text.replace(',', '\n').splitlines():
+        if not part.strip():
+            continue
+        try:
+            quantity, price = part.split(':')
+            quantity = int(quantity.strip())
+            cents = to_cents(price.strip().lstrip('$'))
+        except Exception:
+            raise ValueError(f'Invalid price tier "{part.strip()}" (use quantity: price)')
+        if quantity < 2 or cents < 0:
+            raise ValueError(f'Invalid price tier "{part.strip()}"')
+        tiers[quantity] = cents
+    return sorted(tiers.items())
+
+
+def format_tiers(product):
+    """Tiers as editable text for the product form."""
+    return '\n'.join(f'{t.min_quantity}: {t.unit_price_cents / 100:.2f}' for t in product.price_tiers)
+
+
+def set_product_tiers(product, tiers):
+    """Replace a product's tiers with (min_quantity, unit_price_cents) pairs."""
+    product.price_tiers = [PriceTier(min_quantity=quantity, unit_price_cents=cents) for quantity, cents in tiers]
+
+
+class PriceTable:
+    """
+    Unit prices for every product, indexed by quantity.
+
+    units[product_id][q] is the unit price in cents for q pieces; quantities
+    past the last tier use the last entry.
+    """
+
+    def __init__(self, version, base_prices, tiers):
+        self.version = version
+        self.units = {}
+        for product_id, base_price in base_prices.items():
+            product_tiers = tiers.get(product_id, [])
+            size = (product_tiers[-1][0] if product_tiers else 1) + 1
+            units = [to_cents(base_price)] * size
+            for min_quantity, cents in product_tiers:
+                units[min_quantity:] = [cents] * (size - min_quantity)
+            self.units[product_id] = units
+
+    def unit_cents(self, product_id, quantity):
+        units = self.units[product_id]
+        # Quantities are validated before they get here; clamp anyway so a bad one can't wrap around
+        return units[min(max(quantity, 1), len(units) - 1)]
+
+    def __contains__(self, product_id):
+        return product_id in self.units
+
+
+def _version_path():
+    return os.path.join(current_app.instance_path, 'pricing.version')
+
+
+def _current_version():
+    try:
+        return os.stat(_version_path()).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def invalidate_prices():
+    """Call after editing products or tiers; every worker rebuilds its table on next use."""
+    path = _version_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a'):
+        pass
+    os.utime(path)
+    global _table
+    _table = None
+
+
+def get_price_table():
+    """The compiled price table, rebuilt if another worker changed prices."""
+    global _table
+    version = _current_version()
+    table = _table
+    if table is not None and table.version == version:
+        return table
+    with _table_lock:
+        if _table is None or _table.version != version:
+            base_prices = dict(db.session.query(Product.id, Product.base_price))
+            tiers = {}
+            query = (db.session.query(PriceTier.product_id, PriceTier.min_quantity, PriceTier.unit_price_cents)
+                     .order_by(PriceTier.product_id, PriceTier.min_quantity))
+            for product_id, min_quantity, cents in query:
+                tiers.setdefault(product_id, []).append((min_quantity, cents))
+            _table = PriceTable(version, base_prices, tiers)
+        return _table
+
+
+def get_tax_rate():
+    return Decimal(AdminSettings.get('tax_rate', DEFAULT_TAX_RATE))
+
+
+def totals_for(subtotal_cents, tax_rate=None):
+    """Totals dict in cents and dollars; tax is rounded once, on the subtotal."""
+    tax_rate = get_tax_rate() if tax_rate is None else tax_rate
+    tax_cents = int((subtotal_cents * tax_rate).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+    total_cents = subtotal_cents + tax_cents
+    return {
+        'subtotal': to_dollars(subtotal_cents),
+        'tax': to_dollars(tax_cents),
+        'total': to_dollars(total_cents),
+        'tax_rate': float(tax_rate),
+        'subtotal_cents': subtotal_cents,
+        'tax_cents': tax_cents,
+        'total_cents': total_cents,
+    }
+
+
+def quote(lines, aggregate=True, table=None):
+    """
+    Price many (product_id, quantity) lines in one call.
+
+    With aggregate, tiers use the total quantity of each product across all
+    lines (200 personalized mugs at one piece each get the 200-piece price).
+    Returns (prices, subtotal_cents) where prices is a list of
+    (unit_cents, line_cents). Raises ValueError for unknown products.
+    """
+    table = table or get_price_table()
+    tier_quantity = {}
+    if aggregate:
+        for product_id, quantity in lines:
+            tier_quantity[product_id] = tier_quantity.get(product_id, 0) + quantity
+
+    prices = []
+    subtotal = 0
+    for product_id, quantity in lines:
+        if product_id not in table:
+            raise ValueError(f'Unknown product {product_id}')
+        unit = table.unit_cents(product_id, tier_quantity.get(product_id, quantity))
+        line = unit * quantity
+        prices.append((unit, line))
+        subtotal += line
+    return prices, subtotal
+
+
+def _set_line(item, unit_cents):
+    item['unit_cents'] = unit_cents
+    item['line_cents'] = unit_cents * item['quantity']
+    item['unit_price'] = to_dollars(unit_cents)
+    item['line_total'] = to_dollars(item['line_cents'])
+
+
+def reprice_product(cart, summary, product_id, table):
+    """
+    Reprice just the cart lines for one product and adjust the running subtotal.
+
+    Called after a line for product_id is added, changed or removed; lines for
+    other products keep their prices. Returns the ids of lines whose price changed.
+    """
+    lines = [item for item in cart if item['product_id'] == product_id]
+    quantity = sum(item['quantity'] for item in lines)
+    key = str(product_id)
+    previous = summary['products'].pop(key, None)
+    if previous:
+        summary['subtotal_cents'] -= previous[1]
+    if not lines:
+        return []
+
+    if product_id in table:
+        unit = table.unit_cents(product_id, quantity)
+    else:
+        # Product deleted since it was added; keep the price the customer saw
+        unit = lines[0].get('unit_cents') or to_cents(lines[0]['unit_price'])
+    changed = []
+    for item in lines:
+        if item.get('unit_cents') != unit or item.get('line_cents') != unit * item['quantity']:
+            _set_line(item, unit)
+            changed.append(item['id'])
+    line_total = unit * quantity
+    summary['products'][key] = [quantity, line_total]
+    summary['subtotal_cents'] += line_total
+    return changed
+
+
+def summarize_cart(cart, table):
+    """Full pricing pass, used when there's no summary or prices have changed since it was made."""
+    summary = {'version': table.version, 'lines': len(cart), 'subtotal_cents': 0, 'products': {}}
+    for product_id in {item['product_id'] for item in cart}:
+        reprice_product(cart, summary, product_id, table)
+    return summary
@@ -0,0 +1,261 @@
+"""
+On-demand request profiling for Let Me Mug You.
+A background thread samples the request thread's stack every few
+milliseconds, so profiled requests run at close to normal speed. Each
+profile is saved as flamegraph-ready collapsed stacks plus a pstats file
+built from the same samples, in a ring directory that keeps the newest few.
+
+Profiling is triggered by a signed token (?_profile=<token> or an
+X-Profile header, issued from the admin Profiles page) or by a time-boxed
+"every Nth request" mode. Samples need real threads, so use sync workers.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import marshal
+import threading
+from collections import Counter
+from flask import current_app, request, g
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+
+PROFILE_INTERVAL = 0.005  # Seconds between samples
+PROFILE_KEEP = 50  # Profiles kept in the ring directory
+TOKEN_MAX_AGE = 3600
+TOKEN_SALT = 'request-profile'
+
+_mode_cache = {'mtime': None, 'mode': None}
+_request_count = 0
+_count_lock = threading.Lock()
+
+
+class StackSampler:
+    """Samples one thread's Python stack from a background thread."""
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    def sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+            frame = frame.f_back
+        if stack:
+            self.stacks[tuple(reversed(stack))] += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        if not self.stacks:
+            # Request finished inside one interval; one sample keeps the files loadable
+            self.sample()
+
+
+def _frame_label(func):
+    filename, line, name = func
+    parts = filename.replace('\\', '/').split('/')
+    return f"{name} ({'/'.join(parts[-2:])}:{line})"
+
+
+def collapsed_stacks(stacks):
+    """Brendan Gregg's collapsed format: 'root;child;leaf count' per line."""
+    return ''.join(f"{';'.join(_frame_label(func) for func in stack)} {count}\n"
+                   for stack, count in stacks.most_common())
+
+
+def sample_stats(stacks, interval):
+    """
+    A pstats-compatible stats dict from stack samples.
+
+    Call counts are sample counts and times are samples * interval, so the
+    numbers are estimates, but pstats, snakeviz and friends read it as usual.
+    """
+    stats = {}
+    for stack, count in stacks.items():
+        elapsed = count * interval
+        seen = set()
+        for index, func in enumerate(stack):
+            entry = stats.setdefault(func, [0, 0, 0.0, 0.0, {}])
+            if func in seen:
+                continue  # Recursion: count cumulative time once per sample
+            seen.add(func)
+            entry[0] += count
+            entry[1] += count
+            entry[3] += elapsed
+            if index:
+                caller = entry[4].setdefault(stack[index - 1], [0, 0, 0.0, 0.0])
+                caller[0] += count
+                caller[1] += count
+                caller[3] += elapsed
+        stats[stack[-1]][2] += elapsed
+        if len(stack) > 1:
+            # The leaf may have recursed, in which case the loop skipped its caller record
+            stats[stack[-1]][4].setdefault(stack[-2], [0, 0, 0.0, 0.0])[2] += elapsed
+    return {func: (cc, nc, tt, ct, {caller: tuple(values) for caller, values in callers.items()})
+            for func, (cc, nc, tt, ct, callers) in stats.items()}
+
+
+def get_profile_folder():
+    folder = os.path.join(current_app.instance_path, 'profiles')
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.secret_key, salt=TOKEN_SALT)
+
+
+def make_profile_token():
+    """Signed token that profiles any request carrying it, valid for TOKEN_MAX_AGE."""
+    return _serializer().dumps('profile')
+
+
+def verify_profile_token(token):
+    try:
+        return _serializer().loads(token, max_age=TOKEN_MAX_AGE) == 'profile'
+    except BadSignature:
+        return False
+
+
+def _mode_path():
+    # Checked on every request, so don't create the folder here
+    return os.path.join(current_app.instance_path, 'profiles', 'mode.json')
+
+
+def get_sampling_mode():
+    """The active every-Nth mode dict, or None. Re-read only when another worker changes it."""
+    try:
+        mtime = os.stat(_mode_path()).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if mtime != _mode_cache['mtime']:
+        with open(_mode_path()) as f:
+            _mode_cache['mode'] = json.load(f)
+        _mode_cache['mtime'] = mtime
+    mode = _mode_cache['mode']
+    if not mode or mode['until'] < time.time():
+        return None
+    return mode
+
+
+def set_sampling_mode(every, minutes, endpoint=''):
+    """Profile every Nth request (optionally one endpoint only) for the next few minutes."""
+    mode = {'every': max(1, int(every)), 'until': time.time() + minutes * 60, 'endpoint': endpoint}
+    get_profile_folder()
+    with open(_mode_path(), 'w') as f:
+        json.dump(mode, f)
+    return mode
+
+
+def clear_sampling_mode():
+    try:
+        os.remove(_mode_path())
+    except FileNotFoundError:
+        pass
+
+
+def _should_profile():
+    token = request.args.get('_profile') or request.headers.get('X-Profile')
+    if token:
+        return verify_profile_token(token)
+
+    mode = get_sampling_mode()
+    if mode is None or (mode['endpoint'] and mode['endpoint'] != request.endpoint):
+        return False
+    global _request_count
+    with _count_lock:
+        _request_count += 1
+        return _request_count % mode['every'] == 0
+
+
+def _save_profile(info, sampler):
+    folder = get_profile_folder()
+    base = os.path.join(folder, info['id'])
+    with open(f'{base}.collapsed', 'w') as f:
+        f.write(collapsed_stacks(sampler.stacks))
+    with open(f'{base}.pstats', 'wb') as f:
+        marshal.dump(sample_stats(sampler.stacks, sampler.interval), f)
+    with open(f'{base}.json', 'w') as f:
+        json.dump(info, f)
+
+    # Ring directory: drop the oldest profiles beyond PROFILE_KEEP
+    metas = sorted(name for name in os.listdir(folder) if name.endswith('.json') and name != 'mode.json')
+    for name in metas[:-current_app.config.get('PROFILE_KEEP', PROFILE_KEEP)]:
+        for ext in ('.json', '.collapsed', '.pstats'):
+            try:
+                os.remove(os.path.join(folder, name[:-5] + ext))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles():
+    """Saved profile summaries, newest first."""
+    folder = get_profile_folder()
+    profiles = []
+    for name in sorted(os.listdir(folder), reverse=True):
+        if name.endswith('.json') and name != 'mode.json':
+            try:
+                with open(os.path.join(folder, name)) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    return profiles
+
+
+def init_profiling(app):
+    """Register the request hooks that start and save profiles."""
+
+    @app.before_request
+    def start_profile():
+        if not app.config.get('PROFILING_ENABLED', True) or not _should_profile():
+            return
+        sampler = StackSampler(threading.get_ident(), app.config.get('PROFILE_INTERVAL', PROFILE_INTERVAL))
+        now = time.time()
+        g.profile = {
+            # Sortable ids keep the ring directory in age order
+            'id': f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}-{int(now % 1 * 1e6):06d}-{uuid.uuid4().hex[:4]}",
+            'endpoint': request.endpoint,
+            'method': request.method,
+            'path': request.path,
+            'started': now,
+        }
+        g.profile_sampler = sampler
+        g.profile_started = time.perf_counter()
+        sampler.start()
+
+    @app.after_request
+    def tag_profile(response):
+        if 'profile' in g:
+            g.profile['status'] = response.status_code
+            response.headers['X-Profile-Id'] = g.profile['id']
+        return response
+
+    @app.teardown_request
+    def save_profile(exc):
+        sampler = g.pop('profile_sampler', None)
+        if sampler is None:
+            return
+        sampler.stop()
+        info = g.pop('profile')
+        info['duration_ms'] = round((time.perf_counter() - g.pop('profile_started')) * 1000, 1)
+        info['samples'] = sum(sampler.stacks.values())
+        info.setdefault('status', 500 if exc else None)
+        try:
+            _save_profile(info, sampler)
+        except Exception as e:
+            # A profiler problem must never fail the request it was watching
+            app.logger.error(f'Could not save profile: {str(e)}')
@@ -0,0 +1,231 @@
+"""
+Slow-query log for Let Me Mug You.
+Every statement is timed; ones slower than the threshold are (sampled,
+then) recorded with their parameter shapes and SQLite's EXPLAIN QUERY PLAN,
+aggregated by a normalized statement fingerprint in instance/querylog.db so
+all workers feed one report (flask query-report). Parameter values are
+never stored.
+
+SQLite's execute() only prepares a statement and steps to the first row;
+a full scan does its work while the rows are fetched. So Session.execute
+(which Model.query uses too) is timed until its result has been buffered.
+Streaming queries (yield_per) and Core connections are timed at the cursor
+only, which undercounts fetch-bound work.
+"""
+import os
+import re
+import time
+import random
+import hashlib
+import sqlite3
+import threading
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+DEFAULT_THRESHOLD_MS = 50
+DEFAULT_SAMPLE_RATE = 0.1
+PLAN_REFRESH = 600  # Seconds before a worker re-explains a fingerprint it has already recorded
+
+EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE', 'WITH')  # Plain INSERT ... VALUES plans say nothing
+
+_local = threading.local()
+_explained = {}  # fingerprint -> time this worker last captured its plan
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PARAM_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+_FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(?!CONSTANT ROW)(\w+)(?: AS \w+)?$')  # No "USING ... INDEX"
+
+
+def normalize_statement(statement):
+    """Statement with literals and IN-lists collapsed, so repeats share a fingerprint."""
+    normalized = _STRING_LITERAL.sub('?', statement)
+    normalized = _NUMBER.sub('?', normalized)
+    normalized = _PARAM_LIST.sub('(?+)', normalized)
+    return _WHITESPACE.sub(' ', normalized).strip()
+
+
+def fingerprint(normalized):
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+
+def _value_shape(value):
+    if isinstance(value, str):
+        return 'str'
+    if isinstance(value, bytes):
+        return 'bytes'
+    return type(value).__name__
+
+
+def parameter_shape(parameters, executemany=False):
+    """Types of the bound parameters, e.g. '(int, str)' or '500 x (int, str)'; never the values."""
+    if executemany:
+        rows = list(parameters or [])
+        return f'{len(rows)} x {parameter_shape(rows[0]) if rows else "()"}'
+    if isinstance(parameters, dict):
+        return '(' + ', '.join(f'{key}: {_value_shape(value)}' for key, value in parameters.items()) + ')'
+    return '(' + ', '.join(_value_shape(value) for value in parameters or ()) + ')'
+
+
+def plan_flags(plan):
+    """Problems worth flagging in EXPLAIN QUERY PLAN detail lines."""
+    flags = []
+    for detail in plan:
+        match = _FULL_SCAN.match(detail)
+        if match:
+            flags.append(f'full scan of {match.group(1)}')
+        if 'USE TEMP B-TREE' in detail:
+            flags.append('temp b-tree (' + detail.split('FOR ', 1)[-1].lower() + ')')
+    return flags
+
+
+def _get_connection(path):
+    """Per-thread (and per-forked-worker) connection to the shared query log."""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid():
+        return conn
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+    # Diagnostics only, so trade durability for speed
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute('''CREATE TABLE IF NOT EXISTS slow_queries (
+        fingerprint TEXT PRIMARY KEY,
+        statement TEXT,
+        params TEXT,
+        plan TEXT,
+        flags TEXT,
+        count INTEGER,
+        total_ms REAL,
+        max_ms REAL,
+        first_seen REAL,
+        last_seen REAL)''')
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+
+def _explain(dbapi_conn, statement, parameters, executemany):
+    if executemany:
+        parameters = next(iter(parameters or []), ())
+    rows = dbapi_conn.execute(f'EXPLAIN QUERY PLAN {statement}', parameters or ()).fetchall()
+    return [row[-1] for row in rows]
+
+
+def record_slow_query(path, statement, elapsed_ms, params, plan=None):
+    """Fold one slow execution into its fingerprint's totals."""
+    normalized = normalize_statement(statement)
+    key = fingerprint(normalized)
+    now = time.time()
+    conn = _get_connection(path)
+    conn.execute('''INSERT INTO slow_queries
+                        (fingerprint, statement, params, plan, flags, count, total_ms, max_ms, first_seen, last_seen)
+                    VALUES (?, ?, ?, ?, ?, 1, ?, ?, ?, ?)
+                    ON CONFLICT (fingerprint) DO UPDATE SET
+                        params = excluded.params,
+                        plan = COALESCE(excluded.plan, plan),
+                        flags = COALESCE(excluded.flags, flags),
+                        count = count + 1,
+                        total_ms = total_ms + excluded.total_ms,
+                        max_ms = MAX(max_ms, excluded.max_ms),
+                        last_seen = excluded.last_seen''',
+                 (key, normalized, params,
+                  '\n'.join(plan) if plan is not None else None,
+                  '; '.join(plan_flags(plan)) if plan is not None else None,
+                  elapsed_ms, elapsed_ms, now, now))
+    return key
+
+
+def init_query_log(app, engine):
+    """Attach slow-query logging to engine if QUERYLOG_ENABLED is set."""
+    if not app.config.get('QUERYLOG_ENABLED'):
+        return
+    threshold = app.config.get('QUERYLOG_THRESHOLD_MS', DEFAULT_THRESHOLD_MS) / 1000
+    sample_rate = app.config.get('QUERYLOG_SAMPLE_RATE', DEFAULT_SAMPLE_RATE)
+    path = os.path.join(app.instance_path, 'querylog.db')
+
+    def check_duration(dbapi_conn, statement, parameters, executemany, elapsed):
+        if elapsed < threshold or random.random() >= sample_rate:
+            return
+        try:
+            key = fingerprint(normalize_statement(statement))
+            plan = None
+            # Plans rarely change, so each worker explains a fingerprint once per PLAN_REFRESH
+            if (statement.lstrip().upper().startswith(EXPLAINABLE)
+                    and time.time() - _explained.get(key, 0) > PLAN_REFRESH):
+                _explained[key] = time.time()
+                try:
+                    plan = _explain(dbapi_conn, statement, parameters, executemany)
+                except sqlite3.Error as e:
+                    plan = [f'(EXPLAIN failed: {str(e)})']
+            record_slow_query(path, statement, elapsed * 1000, parameter_shape(parameters, executemany), plan)
+        except Exception as e:
+            # Diagnostics must never fail the query they're watching
+            app.logger.warning(f'Slow-query log error: {str(e)}')
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info['query_started'] = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def stop_timer(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop('query_started', None)
+        if started is None:
+            return
+        statements = getattr(_local, 'orm_statements', None)
+        if statements is not None:
+            # Inside Session.execute, which times it once the rows are fetched
+            statements.append((cursor.connection, statement, parameters, executemany))
+            return
+        check_duration(cursor.connection, statement, parameters, executemany, time.perf_counter() - started)
+
+    @event.listens_for(Session, 'do_orm_execute')
+    def time_orm_execute(orm_execute_state):
+        if getattr(_local, 'orm_statements', None) is not None:
+            return None  # Loader queries run while an outer result is fetched count towards it
+        try:
+            if orm_execute_state.session.get_bind(mapper=orm_execute_state.bind_mapper,
+                                                  clause=orm_execute_state.statement).engine is not engine:
+                return None
+        except Exception:
+            return None
+        if orm_execute_state.execution_options.get('yield_per') or \
+                orm_execute_state.execution_options.get('stream_results'):
+            return None  # Buffering would defeat streaming; timed at the cursor instead
+
+        # DML has done its work by the time execute() returns; reads haven't
+        is_dml = orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete
+        _local.orm_statements = statements = []
+        started = time.perf_counter()
+        try:
+            result = orm_execute_state.invoke_statement()
+            if not is_dml and getattr(result, 'returns_rows', True):
+                # Fetch the rows now (as .all() would) so the scan is inside the timing
+                result = result.freeze()()
+        finally:
+            _local.orm_statements = None
+        if statements:
+            # The first statement is the one asked for; the rest are its loaders
+            check_duration(*statements[0], time.perf_counter() - started)
+        return result
+
+
+def slow_query_report(path, limit=20, order_by='total_ms'):
+    """Top fingerprints as dicts, worst first."""
+    if not os.path.exists(path):
+        return []
+    column = {'total': 'total_ms', 'max': 'max_ms', 'count': 'count'}.get(order_by, 'total_ms')
+    conn = _get_connection(path)
+    conn.row_factory = sqlite3.Row
+    try:
+        rows = conn.execute(f'SELECT * FROM slow_queries ORDER BY {column} DESC LIMIT ?', (limit,)).fetchall()
+    finally:
+        conn.row_factory = None
+    return [dict(row) for row in rows]
+
+
+def reset_slow_queries(path):
+    if os.path.exists(path):
+        _get_connection(path).execute('DELETE FROM slow_queries')
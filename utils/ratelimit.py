@@ -0,0 +1,185 @@
+"""
+Admission control for Let Me Mug You.
+Token-bucket rate limits per IP and per session, shared by all Gunicorn
+workers through a small SQLite file, plus a cross-process cap on how many
+image-processing requests run at once.
+"""
+import os
+import math
+import time
+import uuid
+import random
+import sqlite3
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from flask import current_app, request, session, jsonify
+
+try:
+    import fcntl  # Cross-process slots; falls back to per-process on Windows
+except ImportError:
+    fcntl = None
+
+# Endpoint limits: (bucket capacity, tokens refilled per second)
+DEFAULT_LIMITS = {
+    'upload': {'ip': (20, 0.5), 'session': (10, 0.2)},
+    'cart': {'ip': (60, 2), 'session': (30, 1)},
+    'checkout': {'ip': (10, 0.2), 'session': (5, 0.1)},
+    'quote': {'ip': (30, 1)},
+}
+BUCKET_TTL = 3600  # Forget idle buckets after an hour
+PRUNE_PROBABILITY = 0.001
+SLOT_RETRY_AFTER = 2  # Seconds to suggest when every processing slot is busy
+
+_local = threading.local()
+_fallback_semaphore = None
+_proxy_warned = False
+
+
+def _db_path():
+    return os.path.join(current_app.instance_path, 'ratelimit.db')
+
+
+def _get_connection():
+    """Per-thread (and per-forked-worker) connection to the shared limiter database."""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid():
+        return conn
+
+    path = _db_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+    # Limiter state is disposable, so trade durability for speed
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute('CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)')
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+
+def take_token(key, capacity, rate, now=None):
+    """
+    Take one token from the bucket for key.
+
+    Returns 0 if allowed, otherwise the seconds until a token is available.
+    """
+    now = time.time() if now is None else now
+    conn = _get_connection()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+        tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+        wait = 0 if tokens >= 1 else (1 - tokens) / rate
+        if not wait:
+            tokens -= 1
+        conn.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                     (key, tokens, now))
+        if random.random() < PRUNE_PROBABILITY:
+            conn.execute('DELETE FROM buckets WHERE updated < ?', (now - BUCKET_TTL,))
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return wait
+
+
+def _client_ip():
+    """The address per-IP buckets are keyed on; warns once if it looks like the proxy's, not the client's."""
+    global _proxy_warned
+    if not _proxy_warned and not current_app.config.get('PROXY_COUNT') and \
+            ('X-Forwarded-For' in request.headers or not request.remote_addr):
+        _proxy_warned = True
+        current_app.logger.warning(
+            'Rate limiting is on, but requests arrive through a proxy or unix socket and PROXY_COUNT '
+            'is not set: every client shares one per-IP bucket. Set PROXY_COUNT=1 behind Nginx.')
+    return request.remote_addr
+
+
+def _session_key():
+    if 'rl_id' not in session:
+        session['rl_id'] = uuid.uuid4().hex
+    return session['rl_id']
+
+
+def _too_many(retry_after, message):
+    response = jsonify({'error': message})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def rate_limit(name):
+    """Decorator applying the per-IP and per-session buckets configured for name."""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not current_app.config.get('RATELIMIT_ENABLED', True):
+                return f(*args, **kwargs)
+
+            limits = current_app.config.get('RATE_LIMITS', DEFAULT_LIMITS).get(name, {})
+            wait = 0
+            if 'ip' in limits:
+                wait = take_token(f'{name}:ip:{_client_ip()}', *limits['ip'])
+            if not wait and 'session' in limits:
+                wait = take_token(f'{name}:session:{_session_key()}', *limits['session'])
+            if wait:
+                return _too_many(wait, 'Too many requests. Please slow down and try again shortly.')
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+
+@contextmanager
+def processing_slot(name='image'):
+    """
+    Hold one of the app-wide processing slots, or yield False if all are busy.
+
+    Slots are flock()ed files, so the cap covers every worker process and a
+    crashed worker's slot is released by the OS.
+    """
+    slots = current_app.config.get('IMAGE_PROCESSING_SLOTS') or os.cpu_count() or 2
+
+    if fcntl is None:
+        global _fallback_semaphore
+        if _fallback_semaphore is None:
+            _fallback_semaphore = threading.BoundedSemaphore(slots)
+        acquired = _fallback_semaphore.acquire(blocking=False)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                _fallback_semaphore.release()
+        return
+
+    folder = os.path.join(current_app.instance_path, 'slots')
+    os.makedirs(folder, exist_ok=True)
+    for index in random.sample(range(slots), slots):
+        handle = open(os.path.join(folder, f'{name}-{index}.lock'), 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            handle.close()
+            continue
+        try:
+            yield True
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+            handle.close()
+        return
+    yield False
+
+
+def limit_concurrency(name='image'):
+    """Decorator that returns 429 instead of queueing when every processing slot is busy."""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not current_app.config.get('RATELIMIT_ENABLED', True):
+                return f(*args, **kwargs)
+            with processing_slot(name) as acquired:
+                if not acquired:
+                    return _too_many(SLOT_RETRY_AFTER, 'Server is busy processing images. Please try again.')
+                return f(*args, **kwargs)
+        return decorated_function
+    return decorator
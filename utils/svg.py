@@ -0,0 +1,288 @@
+"""
+SVG ingestion for Let Me Mug You.
+Uploaded SVGs are streamed through a SAX parser that reads the real
+dimensions, strips scripts and external references, minifies path data,
+and writes a normalized copy that is cached by content hash.
+"""
+import os
+import re
+import hashlib
+import xml.sax
+from xml.sax.saxutils import escape, quoteattr
+from flask import current_app
+
+DEFAULT_SIZE = (200, 200)
+PATH_PRECISION = 3
+SANITIZER_VERSION = 2  # Part of the cache key, so a stricter sanitizer never reuses older output
+
+# Elements dropped together with everything inside them
+DROP_ELEMENTS = {'script', 'foreignobject', 'metadata', 'iframe', 'embed', 'object', 'handler', 'listener',
+                 # Animation can rewrite any attribute (href included) after sanitizing
+                 'animate', 'set', 'animatemotion', 'animatetransform', 'animatecolor'}
+# Editor namespaces that only bloat the file
+DROP_PREFIXES = ('sodipodi:', 'inkscape:', 'sketch:', 'serif:')
+# Elements whose whitespace matters
+TEXT_ELEMENTS = {'text', 'tspan', 'textpath', 'style', 'title', 'desc'}
+
+UNIT_TO_PX = {'': 1, 'px': 1, 'pt': 4 / 3, 'pc': 16, 'mm': 96 / 25.4, 'cm': 96 / 2.54, 'in': 96, 'em': 16, 'ex': 8}
+_LENGTH = re.compile(r'^\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*([a-z%]*)\s*$', re.IGNORECASE)
+_PATH_TOKEN = re.compile(r'[MmZzLlHhVvCcSsQqTtAa]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+_CSS_IMPORT = re.compile(r'@import[^;]*;?', re.IGNORECASE)
+_CSS_URL = re.compile(r'url\(\s*(?![\'"]?\s*#)[^)]*\)', re.IGNORECASE)  # Keeps url(#id) and url('#id')
+_CSS_SCRIPT = re.compile(r'(expression\s*\(|javascript:)', re.IGNORECASE)
+_SAFE_DATA_URI = re.compile(r'^data:image/(png|jpe?g|gif|webp);base64,', re.IGNORECASE)
+
+
+class _RootFound(Exception):
+    """Raised to stop parsing once the root element has been read."""
+
+    def __init__(self, attrs):
+        super().__init__()
+        self.attrs = attrs
+
+
+def _local(name):
+    return name.rsplit(':', 1)[-1].lower()
+
+
+def parse_length(value):
+    """SVG length in px, or None for missing, percentage or unknown units."""
+    match = _LENGTH.match(value or '')
+    if not match or match.group(2).lower() not in UNIT_TO_PX:
+        return None
+    return float(match.group(1)) * UNIT_TO_PX[match.group(2).lower()]
+
+
+def parse_viewbox(value):
+    try:
+        parts = [float(p) for p in re.split(r'[\s,]+', (value or '').strip())]
+    except ValueError:
+        return None
+    if len(parts) != 4 or parts[2] <= 0 or parts[3] <= 0:
+        return None
+    return parts
+
+
+def root_dimensions(attrs):
+    """Rendered (width, height) in px from the root element's width/height/viewBox."""
+    width = parse_length(attrs.get('width'))
+    height = parse_length(attrs.get('height'))
+    viewbox = parse_viewbox(attrs.get('viewBox'))
+
+    if viewbox:
+        aspect = viewbox[2] / viewbox[3]
+        if width and not height:
+            height = width / aspect
+        elif height and not width:
+            width = height * aspect
+        elif not width and not height:
+            width, height = viewbox[2], viewbox[3]
+    if not width or not height or width <= 0 or height <= 0:
+        return DEFAULT_SIZE
+    return round(width), round(height)
+
+
+def _make_parser(handler):
+    parser = xml.sax.make_parser()
+    parser.setFeature(xml.sax.handler.feature_namespaces, False)
+    parser.setFeature(xml.sax.handler.feature_external_ges, False)
+    parser.setFeature(xml.sax.handler.feature_external_pes, False)
+    parser.setContentHandler(handler)
+    return parser
+
+
+class _RootHandler(xml.sax.ContentHandler):
+    def startElement(self, name, attrs):
+        raise _RootFound(dict(attrs))
+
+
+def svg_dimensions(path):
+    """Read an SVG's dimensions from its root element without parsing the rest."""
+    try:
+        _make_parser(_RootHandler()).parse(path)
+    except _RootFound as found:
+        return root_dimensions(found.attrs)
+    return DEFAULT_SIZE
+
+
+def _format_number(value, precision):
+    text = f'{value:.{precision}f}'.rstrip('0').rstrip('.')
+    if text in ('-0', ''):
+        return '0'
+    if text.startswith('0.'):
+        return text[1:]
+    if text.startswith('-0.'):
+        return '-' + text[2:]
+    return text
+
+
+def minify_path(d, precision=PATH_PRECISION):
+    """Round path coordinates and drop redundant separators."""
+    # Arc flags may be packed without separators ("a1 1 0 011 1"), so leave those alone
+    if re.search(r'[Aa]', d):
+        return ' '.join(d.split())
+
+    out = []
+    previous = None
+    for token in _PATH_TOKEN.findall(d):
+        if token.isalpha():
+            out.append(token)
+            previous = None
+            continue
+        number = _format_number(float(token), precision)
+        if previous is not None and not number.startswith('-') and \
+                not (number.startswith('.') and '.' in previous):
+            out.append(' ')
+        out.append(number)
+        previous = number
+    return ''.join(out)
+
+
+def sanitize_css(css):
+    """Remove imports, external url() references and script from CSS."""
+    css = _CSS_IMPORT.sub('', css)
+    css = _CSS_URL.sub('none', css)
+    return _CSS_SCRIPT.sub('', css)
+
+
+def _safe_href(value):
+    value = value.strip()
+    return value.startswith('#') or bool(_SAFE_DATA_URI.match(value))
+
+
+class _SanitizingHandler(xml.sax.ContentHandler):
+    """Re-serializes SVG as it streams, skipping anything unsafe."""
+
+    def __init__(self, out):
+        super().__init__()
+        self.out = out
+        self.stack = []
+        self.skip_depth = 0
+        self.open_tag = False
+        self.style_text = None
+        self.dimensions = None
+
+    def _close_open_tag(self):
+        if self.open_tag:
+            self.out.write('>')
+            self.open_tag = False
+
+    def startElement(self, name, attrs):
+        local = _local(name)
+        if self.skip_depth or local in DROP_ELEMENTS or name.lower().startswith(DROP_PREFIXES):
+            self.skip_depth += 1
+            return
+
+        kept = {}
+        for key, value in attrs.items():
+            lower = key.lower()
+            if lower.startswith('on') or lower.startswith(DROP_PREFIXES):
+                continue
+            if lower.startswith('xmlns:') and lower[6:] + ':' in DROP_PREFIXES:
+                continue
+            if _local(lower) == 'href' and not _safe_href(value):
+                continue
+            if lower == 'd' and local == 'path':
+                value = minify_path(value)
+            else:
+                # Presentation attributes (fill, filter, mask, ...) take url() just like style does
+                value = sanitize_css(value)
+            kept[key] = value
+
+        if not self.stack:
+            if local != 'svg':
+                raise ValueError('Not an SVG file')
+            # Root: give Fabric explicit pixel dimensions and a viewBox to scale against
+            self.dimensions = root_dimensions(kept)
+            if not parse_viewbox(kept.get('viewBox')):
+                kept['viewBox'] = f'0 0 {self.dimensions[0]} {self.dimensions[1]}'
+            kept['width'], kept['height'] = str(self.dimensions[0]), str(self.dimensions[1])
+            kept.setdefault('xmlns', 'http://www.w3.org/2000/svg')
+
+        self._close_open_tag()
+        self.out.write('<' + name + ''.join(f' {k}={quoteattr(v)}' for k, v in kept.items()))
+        self.open_tag = True
+        self.stack.append(local)
+        if local == 'style':
+            # CSS can arrive in several chunks; sanitize it whole at the end tag
+            self.style_text = []
+
+    def endElement(self, name):
+        if self.skip_depth:
+            self.skip_depth -= 1
+            return
+        local = self.stack.pop()
+        if local == 'style' and self.style_text:
+            self._close_open_tag()
+            self.out.write(escape(sanitize_css(''.join(self.style_text))))
+        self.style_text = None
+        if self.open_tag:
+            self.out.write('/>')
+            self.open_tag = False
+        else:
+            self.out.write(f'</{name}>')
+
+    def characters(self, content):
+        if self.skip_depth or not self.stack:
+            return
+        if self.stack[-1] == 'style':
+            self.style_text.append(content)
+            return
+        if self.stack[-1] not in TEXT_ELEMENTS:
+            content = content.strip()
+            if not content:
+                return
+        self._close_open_tag()
+        self.out.write(escape(content))
+
+
+def sanitize_svg(source_path, output_path):
+    """
+    Stream source_path into a sanitized, minified SVG at output_path.
+
+    Returns the (width, height) written on the root element.
+    """
+    tmp_path = f'{output_path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as out:
+            handler = _SanitizingHandler(out)
+            try:
+                _make_parser(handler).parse(source_path)
+            except xml.sax.SAXParseException as e:
+                raise ValueError(f'Invalid SVG file (line {e.getLineNumber()})')
+        if handler.dimensions is None:
+            raise ValueError('Not an SVG file')
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return handler.dimensions
+
+
+def get_svg_cache_folder():
+    folder = os.path.join(current_app.instance_path, 'svg_cache')
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def process_svg(source_path, output_path):
+    """Sanitize an uploaded SVG, reusing the cached result for identical uploads. Returns dimensions."""
+    digest = hashlib.sha1()
+    with open(source_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    cached_path = os.path.join(get_svg_cache_folder(), f'{digest.hexdigest()}-v{SANITIZER_VERSION}.svg')
+
+    if os.path.exists(cached_path):
+        dimensions = svg_dimensions(cached_path)
+        os.utime(cached_path)  # Entries still being reused never age out of the GC grace period
+    else:
+        dimensions = sanitize_svg(source_path, cached_path)
+
+    # Hard link when possible so repeat uploads cost no extra disk
+    try:
+        os.link(cached_path, output_path)
+    except OSError:
+        import shutil
+        shutil.copyfile(cached_path, output_path)
+    return dimensions
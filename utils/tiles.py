@@ -0,0 +1,49 @@
+"""
+Memory-bounded image buffers for logo processing.
+Decodes an image once into a single writable RGBA buffer that Pillow and
+NumPy share, then works on it in horizontal strips so temporaries stay
+strip-sized instead of image-sized.
+"""
+import numpy as np
+from PIL import Image
+
+STRIP_ROWS = 256
+
+
+def load_rgba_buffer(img, strip_rows=STRIP_ROWS):
+    """
+    Copy img into a new RGBA bytearray, converting a strip at a time.
+
+    Returns (buffer, view) where view is a writable (height, width, 4) uint8
+    NumPy array over the same memory.
+    """
+    width, height = img.size
+    buffer = bytearray(width * height * 4)
+    row_bytes = width * 4
+    for top in range(0, height, strip_rows):
+        bottom = min(height, top + strip_rows)
+        strip = img.crop((0, top, width, bottom))
+        if strip.mode != 'RGBA':
+            strip = strip.convert('RGBA')
+        buffer[top * row_bytes:bottom * row_bytes] = strip.tobytes()
+    view = np.frombuffer(buffer, dtype=np.uint8).reshape(height, width, 4)
+    return buffer, view
+
+
+def iter_strips(view, strip_rows=STRIP_ROWS):
+    """Yield (top, strip) row-slices of view; strips are views, so edits land in the buffer."""
+    for top in range(0, view.shape[0], strip_rows):
+        yield top, view[top:top + strip_rows]
+
+
+def buffer_image(buffer, size):
+    """Zero-copy Pillow image over an RGBA buffer (read-only on the Pillow side)."""
+    return Image.frombuffer('RGBA', size, buffer, 'raw', 'RGBA', 0, 1)
+
+
+def near_white_mask(strip, threshold, out=None):
+    """Boolean mask of pixels whose R, G and B are all >= threshold, computed in place."""
+    mask = np.greater_equal(strip[:, :, 0], threshold, out=out)
+    mask &= strip[:, :, 1] >= threshold
+    mask &= strip[:, :, 2] >= threshold
+    return mask
@@ -0,0 +1,178 @@
+"""
+Upload storage for Let Me Mug You.
+Logos are sharded into hash-prefix subfolders (logos/ab/ab12...png) so no
+single directory grows huge, and orphaned uploads are garbage collected.
+"""
+import os
+import time
+from werkzeug.utils import secure_filename
+from flask import current_app
+from models import OrderItem, db
+
+SHARD_LENGTH = 2  # 256 subfolders for uuid-hex names
+DEFAULT_GRACE_DAYS = 7
+GC_BATCH_SIZE = 500
+PREVIEW_URL_PREFIX = '/api/preview/'
+
+
+def get_upload_folder():
+    """Folder where uploaded and processed logos are stored."""
+    return os.path.join(current_app.root_path, 'static', 'uploads', 'logos')
+
+
+def file_stem(filename):
+    """Upload id shared by an original and its processed variants ('ab12_bw.png' -> 'ab12')."""
+    return filename.split('.', 1)[0].split('_', 1)[0]
+
+
+def shard_for(filename):
+    return file_stem(filename)[:SHARD_LENGTH].lower()
+
+
+def get_logo_path(filename, for_write=False):
+    """
+    Absolute path for a logo filename, or None if the name is invalid.
+
+    Files live in their shard folder; reads fall back to the legacy flat
+    layout for uploads made before sharding.
+    """
+    filename = secure_filename(filename or '')
+    if not filename:
+        return None
+    folder = get_upload_folder()
+    path = os.path.join(folder, shard_for(filename), filename)
+    if for_write:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+    if not os.path.exists(path):
+        legacy_path = os.path.join(folder, filename)
+        if os.path.exists(legacy_path):
+            return legacy_path
+    return path
+
+
+def get_logo_url(filename):
+    """Public URL for a stored logo."""
+    return f'/static/uploads/logos/{shard_for(filename)}/{filename}'
+
+
+def referenced_logo_stems():
+    """Upload ids referenced by any order item, live or archived (streamed, only the filename column)."""
+    from utils.archive import order_sessions  # Imports this module
+    stems = set()
+    for session in order_sessions():
+        query = (session.query(OrderItem.logo_filename)
+                 .filter(OrderItem.logo_filename.isnot(None), OrderItem.logo_filename != '')
+                 .yield_per(5000))
+        for (filename,) in query:
+            stems.add(file_stem(filename))
+    return stems
+
+
+def referenced_preview_keys():
+    """Preview cache keys referenced by live or archived order items (reads only the key, never the blob)."""
+    from utils.archive import order_sessions
+    start = len(PREVIEW_URL_PREFIX) + 1
+    keys = set()
+    for session in order_sessions():
+        query = (session.query(db.func.substr(OrderItem.preview_data_url, start, 40))
+                 .filter(OrderItem.preview_data_url.like(f'{PREVIEW_URL_PREFIX}%'))
+                 .yield_per(5000))
+        keys.update(key for (key,) in query)
+    return keys
+
+
+def _iter_files(folder):
+    """Yield DirEntry objects for every file in folder and its shard subfolders."""
+    if not os.path.isdir(folder):
+        return
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                with os.scandir(entry.path) as shard_entries:
+                    for shard_entry in shard_entries:
+                        if shard_entry.is_file(follow_symlinks=False):
+                            yield shard_entry
+            elif entry.is_file(follow_symlinks=False) and not entry.name.startswith('.'):
+                yield entry
+
+
+def shard_legacy_files(folder, dry_run=False):
+    """Move files left in the legacy flat layout into their shard folders. Returns the count."""
+    moved = 0
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if not entry.is_file(follow_symlinks=False) or entry.name.startswith('.'):
+                continue
+            if not dry_run:
+                target = os.path.join(folder, shard_for(entry.name), entry.name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(entry.path, target)
+            moved += 1
+    return moved
+
+
+def collect_garbage(folder, referenced, grace_days=DEFAULT_GRACE_DAYS, dry_run=False):
+    """
+    Remove files in folder whose upload id isn't referenced and that are older than the grace period.
+
+    referenced is a set of upload ids, or a function (entry, stat) -> bool
+    for folders where "in use" means something else. The directory is
+    walked with scandir and deletions are done in batches, so memory doesn't
+    grow with the number of files. Returns a stats dict with file counts and
+    byte totals.
+    """
+    cutoff = time.time() - grace_days * 86400
+    in_use = referenced if callable(referenced) else (lambda entry, info: file_stem(entry.name) in referenced)
+    stats = {'files': 0, 'bytes': 0, 'removed': 0, 'reclaimed_bytes': 0}
+    batch = []
+
+    def flush():
+        for path, size in batch:
+            if not dry_run:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+            stats['removed'] += 1
+            stats['reclaimed_bytes'] += size
+        batch.clear()
+
+    for entry in _iter_files(folder):
+        info = entry.stat(follow_symlinks=False)
+        stats['files'] += 1
+        stats['bytes'] += info.st_size
+        if not in_use(entry, info) and info.st_mtime < cutoff:
+            batch.append((entry.path, info.st_size))
+            if len(batch) >= GC_BATCH_SIZE:
+                flush()
+
+    flush()
+    return stats
+
+
+def _hard_linked(entry, info):
+    """A sanitized-SVG cache entry is in use while an uploaded logo is hard-linked to it."""
+    return info.st_nlink > 1
+
+
+def collect_upload_garbage(grace_days=DEFAULT_GRACE_DAYS, dry_run=False):
+    """
+    GC logos and cached previews that no order item references, and SVG
+    cache entries no longer linked to any logo.
+
+    Logos left in the legacy flat layout are moved into shard folders.
+    Returns stats per folder.
+    """
+    from utils.preview import get_preview_folder
+    from utils.svg import get_svg_cache_folder
+
+    folder = get_upload_folder()
+    logos = collect_garbage(folder, referenced_logo_stems(), grace_days, dry_run)
+    logos['sharded'] = shard_legacy_files(folder, dry_run) if os.path.isdir(folder) else 0
+    return {
+        'logos': logos,
+        'previews': collect_garbage(get_preview_folder(), referenced_preview_keys(), grace_days, dry_run),
+        # After the logos, so cache entries of logos removed above go in the same pass
+        'svg_cache': collect_garbage(get_svg_cache_folder(), _hard_linked, grace_days, dry_run),
+    }
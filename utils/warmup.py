@@ -0,0 +1,101 @@
+"""
+Worker warm-up for Let Me Mug You.
+Pays the one-off costs (template compilation, mapper configuration, the first
+pooled DB connection, Pillow plugin registration, NumPy code paths) before a
+worker takes traffic instead of on its first requests. Gunicorn runs it from
+post_worker_init (gunicorn.conf.py), before the worker starts accepting.
+"""
+import os
+import time
+import shutil
+import tempfile
+from PIL import Image
+from sqlalchemy import text
+from sqlalchemy.orm import configure_mappers
+from models import db
+
+# This worker's warm-up state, reported by /readyz
+_status = {'state': 'cold', 'steps': {}, 'error': None, 'duration_ms': None}
+
+WARMUP_SVG = ('<svg xmlns="http://www.w3.org/2000/svg" width="16" height="16" viewBox="0 0 16 16">'
+              '<path d="M0 0h8v8H0z" fill="#000"/></svg>')
+
+
+def warmup_status():
+    return dict(_status, pid=os.getpid())
+
+
+def is_ready():
+    return _status['state'] == 'ready'
+
+
+def _compile_templates(app):
+    names = [name for name in app.jinja_env.list_templates() if name.endswith('.html')]
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+def _open_connection(app):
+    # Checked back into the pool when the session is removed
+    db.session.execute(text('SELECT 1'))
+    db.session.remove()
+
+
+def _run_logo_processors(app):
+    from routes.api import (process_logo_to_bw, process_logo_dither, process_logo_transparent,
+                            remove_white_background, remove_background_connected)
+    from utils.dither import DITHER_METHODS
+    from utils.svg import process_svg
+
+    Image.init()  # Register every format plugin now rather than on the first odd upload
+    folder = tempfile.mkdtemp(prefix='warmup-')
+    try:
+        source = os.path.join(folder, 'logo.png')
+        img = Image.new('RGBA', (32, 32), (255, 255, 255, 255))
+        img.paste((0, 0, 0, 255), (8, 8, 24, 24))
+        img.save(source, 'PNG')
+        img.convert('RGB').save(os.path.join(folder, 'logo.jpg'), 'JPEG')
+
+        output = os.path.join(folder, 'out.png')
+        process_logo_to_bw(source, output)
+        for method in DITHER_METHODS:
+            process_logo_dither(source, output, method)
+        process_logo_transparent(os.path.join(folder, 'logo.jpg'), output)
+        remove_white_background(source, output)
+        remove_background_connected(source, output)
+        remove_background_connected(source, output, feather=1)
+
+        svg_path = os.path.join(folder, 'logo.svg')
+        with open(svg_path, 'w') as f:
+            f.write(WARMUP_SVG)
+        process_svg(svg_path, os.path.join(folder, 'out.svg'))
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+WARMUP_STEPS = [
+    ('templates', _compile_templates),
+    ('mappers', lambda app: configure_mappers()),
+    ('database', _open_connection),
+    ('images', _run_logo_processors),
+]
+
+
+def warm_up(app):
+    """Run every warm-up step in this process. A failed step is logged and marks the worker not ready."""
+    _status.update(state='warming', steps={}, error=None)
+    started = time.perf_counter()
+    with app.app_context():
+        for name, step in WARMUP_STEPS:
+            step_started = time.perf_counter()
+            try:
+                step(app)
+            except Exception as e:
+                _status.update(state='failed', error=f'{name}: {str(e)}')
+                app.logger.error(f'Warm-up step {name} failed: {str(e)}')
+                return False
+            _status['steps'][name] = round((time.perf_counter() - step_started) * 1000, 1)
+    _status.update(state='ready', duration_ms=round((time.perf_counter() - started) * 1000, 1))
+    app.logger.info(f"Worker {os.getpid()} warmed up in {_status['duration_ms']} ms")
+    return True